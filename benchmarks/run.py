@@ -0,0 +1,147 @@
+# coding=utf-8
+"""
+Benchmark of sorting pipeline stages on synthetic workbooks.
+
+Usage example (from repository root):
+    python -m benchmarks.run --sizes 1000 100000 1000000 --output results.json
+
+Every stage is timed separately: load (read-only openpyxl workbook), parse (Parser.parse),
+sort (Sorter.sort, parsing included), dump (Sorter.dump_circuitry) and save (Sorter.save_to_file).
+Peak memory of every stage is measured with tracemalloc unless --no-memory is given.
+"""
+import argparse
+import json
+import logging
+import math
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+import openpyxl  # noqa: E402
+
+from benchmarks.synthetic import generate_workbook  # noqa: E402
+from parser import Parser  # noqa: E402
+from settings import DEFAULT_SETTINGS  # noqa: E402
+from sorter import Sorter  # noqa: E402
+
+
+class StageTimer:
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.results: List[Dict[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str, items: int) -> Iterator[None]:
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            peak = None
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            self.results.append({
+                'stage': name,
+                'seconds': elapsed,
+                'markers_per_second': items / elapsed if elapsed else math.inf,
+                'peak_memory_mb': None if peak is None else peak / 2 ** 20,
+            })
+
+
+def prepare_workbook(workdir: Path, markers: int, markers_per_device: int, **shares: float) -> Path:
+    sections = DEFAULT_SETTINGS.wire_sections
+    devices_per_section = max(1, math.ceil(markers / (markers_per_device * len(sections))))
+    shares_suffix = '_'.join(f'{key}{value}' for key, value in sorted(shares.items()))
+    path = workdir / f'synthetic_{markers}_{markers_per_device}_{shares_suffix}.xlsx'
+    if not path.exists():
+        generate_workbook(path, devices_per_section, markers_per_device, sections, **shares)
+    return path
+
+
+def run_benchmark(path: Path, sorter_options: dict, trace_memory: bool = True) -> List[Dict[str, float]]:
+    timer = StageTimer(trace_memory)
+    with timer.stage('load', 0):
+        workbook = openpyxl.load_workbook(path, read_only=True)
+
+    with timer.stage('parse', 0):
+        schematic: dict = {}
+        Parser(workbook, schematic).parse()
+    markers = sum(len(device.wires) * 2 for devices in schematic.values() for device in devices)
+    del schematic
+
+    sorter = Sorter(workbook=workbook, **sorter_options)
+    sorter.add_sheets([name for name in workbook.sheetnames if name in sorter.settings.wire_sections])
+    with timer.stage('sort', markers):
+        sorter.sort()
+    workbook.close()
+
+    with timer.stage('dump', markers):
+        sorter.dump_circuitry()
+    with tempfile.TemporaryDirectory() as output_dir:
+        with timer.stage('save', markers):
+            sorter.save_to_file(Path(output_dir) / 'output.xlsx', in_place=True)
+
+    for result in timer.results:
+        if result['stage'] in ('load', 'parse'):
+            result['markers_per_second'] = markers / result['seconds'] if result['seconds'] else math.inf
+    return timer.results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                            help='total quantities of markers')
+    arg_parser.add_argument('--markers-per-device', type=int, default=40)
+    arg_parser.add_argument('--jack-share', type=float, default=0.3)
+    arg_parser.add_argument('--connection-share', type=float, default=0.5)
+    arg_parser.add_argument('--unsupported-share', type=float, default=0.01)
+    arg_parser.add_argument('--internal-share', type=float, default=0.1)
+    arg_parser.add_argument('--workers', type=int, default=1)
+    arg_parser.add_argument('--natural', action='store_true')
+    arg_parser.add_argument('--write-only', action='store_true')
+    arg_parser.add_argument('--no-memory', action='store_true', help='do not trace memory, it slows stages down')
+    arg_parser.add_argument('--workdir', type=Path, default=Path(tempfile.gettempdir()) / 'em-sort-benchmarks',
+                            help='generated workbooks are kept here between runs')
+    arg_parser.add_argument('--output', type=Path, help='write results as JSON')
+    args = arg_parser.parse_args(argv)
+    # synthetic workbooks contain unsupported markers on purpose
+    logging.basicConfig(level=logging.ERROR)
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    shares = dict(
+        jack_share=args.jack_share,
+        connection_share=args.connection_share,
+        unsupported_share=args.unsupported_share,
+        internal_share=args.internal_share,
+    )
+    sorter_options = dict(write_only=args.write_only, workers=args.workers, natural_order=args.natural)
+
+    report = []
+    print(f'{"markers":>10} {"stage":>6} {"seconds":>9} {"markers/s":>12} {"peak MB":>9}')
+    for size in args.sizes:
+        path = prepare_workbook(args.workdir, size, args.markers_per_device, **shares)
+        results = run_benchmark(path, sorter_options, trace_memory=not args.no_memory)
+        for result in results:
+            peak = '-' if result['peak_memory_mb'] is None else f'{result["peak_memory_mb"]:.1f}'
+            print(f'{size:>10} {result["stage"]:>6} {result["seconds"]:>9.3f} '
+                  f'{result["markers_per_second"]:>12.0f} {peak:>9}')
+        report.append({'markers': size, 'options': {**shares, **sorter_options}, 'stages': results})
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
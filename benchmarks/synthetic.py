@@ -0,0 +1,77 @@
+# coding=utf-8
+"""Synthetic schematic workbooks generator for benchmarks."""
+import random
+from pathlib import Path
+from typing import List, Sequence
+
+from openpyxl import Workbook
+
+from settings import DEFAULT_SETTINGS
+
+
+def generate_device_markers(
+        device: str,
+        wires_quantity: int,
+        rnd: random.Random,
+        jack_share: float = 0.3,
+        connection_share: float = 0.5,
+        unsupported_share: float = 0.01,
+        internal_share: float = 0.1,
+) -> List[str]:
+    """
+    Generates pairs of markers of one device block.
+
+    :param jack_share: share of device markers with jack: 'A1:X4-1 952'
+    :param connection_share: share of other end markers with connection: 'X2:14:1 9'
+    :param unsupported_share: share of wires with one marker of unsupported format
+    :param internal_share: share of wires connecting two contacts of the same device
+    """
+    markers = []
+    for i in range(wires_quantity):
+        wire_name = f'{device}.{i}'
+        contact = rnd.randint(1, 64)
+        if rnd.random() < jack_share:
+            frm = f'{device}:X{rnd.randint(1, 12)}-{contact} {wire_name}'
+        else:
+            frm = f'{device}:{contact} {wire_name}'
+
+        if rnd.random() < internal_share:
+            to = f'{device}:{rnd.randint(1, 64)} {wire_name}'
+        elif rnd.random() < connection_share:
+            to = f'X{rnd.randint(1, 40)}:{rnd.randint(1, 99)}:{rnd.randint(1, 2)} {wire_name}'
+        else:
+            to = f'SF{rnd.randint(1, 40)}:{rnd.randint(1, 8)} {wire_name}'
+
+        if rnd.random() < unsupported_share:
+            to = f'{device} X4-5:1 {wire_name}'
+        markers.extend((frm, to))
+    return markers
+
+
+def generate_workbook(
+        path: Path,
+        devices_per_section: int,
+        markers_per_device: int,
+        sections: Sequence[str] = DEFAULT_SETTINGS.wire_sections,
+        seed: int = 0,
+        **shares: float,
+) -> int:
+    """
+    Writes workbook with section sheets in the same layout as real schematics: device header and pairs of markers.
+
+    Shares of marker formats are passed to generate_device_markers. Returns total quantity of markers.
+    """
+    rnd = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    total = 0
+    for section in sections:
+        worksheet = workbook.create_sheet(section)
+        for device_index in range(devices_per_section):
+            device = f'A{device_index}'
+            worksheet.append([f'Device {device}'])
+            markers = generate_device_markers(device, markers_per_device // 2, rnd, **shares)
+            for marker in markers:
+                worksheet.append([marker])
+            total += len(markers)
+    workbook.save(path)
+    return total
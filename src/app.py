@@ -1,12 +1,16 @@
+import os
+from typing import Optional
+
 from gui import GUI
+from settings import DEFAULT_SETTINGS, Settings
 from sorter import Sorter
 
 
 class App:
-    def __init__(self, name: str):
-        self.gui = GUI(app_name=name)
-        self.backend = Sorter()
+    def __init__(self, name: str, settings: Settings = DEFAULT_SETTINGS, workers: Optional[int] = 1):
+        self.gui = GUI(app_name=name, wire_sections=settings.wire_sections, workers=workers or os.cpu_count() or 1)
+        # session mode keeps all sections parsed, so lazy sections are not used by GUI
+        self.backend = Sorter(write_only=True, workers=workers, keep_warm=True, settings=settings)
 
     def start(self):
         self.gui.start(backend=self.backend)
-
@@ -0,0 +1,208 @@
+# coding=utf-8
+"""
+Reader and writer backends of non-XLSX formats.
+
+CSV and columnar (Parquet, Arrow IPC) tables have two columns: 'section' and 'value'.
+Rows of every section keep the same layout as XLSX sheet column: device header followed by its markers.
+Tables are exposed to Parser and Sorter through the small subset of openpyxl workbook interface they use,
+so the pipeline works the same way with every backend.
+pyarrow is an optional dependency, it is imported only when columnar format is read or written.
+"""
+import csv
+import importlib.util
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import openpyxl
+from openpyxl import Workbook
+from openpyxl.cell.cell import Cell
+
+from exceptions import UnsupportedFileFormatException
+
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet')
+FORMAT_SUFFIXES = {'xlsx': '.xlsx', 'csv': '.csv', 'parquet': '.parquet'}
+ARROW_SUFFIXES = ('.parquet', '.arrow', '.feather')
+TABLE_COLUMNS = ('section', 'value')
+
+
+class TableSheet:
+    """Single-column sheet of table backend"""
+
+    def __init__(self, title: str, values: Optional[List[Any]] = None):
+        self.title = title
+        self.values: List[Any] = [] if values is None else values
+
+    @property
+    def max_row(self) -> int:
+        return len(self.values)
+
+    @property
+    def max_column(self) -> int:
+        return 1
+
+    def iter_rows(self, min_col: int = 1, max_col: Optional[int] = None, values_only: bool = True) -> Iterator[tuple]:
+        """Same as Worksheet.iter_rows with values_only, only the first column has values"""
+        for value in self.values:
+            yield tuple(value if column == 1 else None for column in range(min_col, (max_col or min_col) + 1))
+
+    def append(self, row: List[Any]) -> None:
+        """Appends the first cell of row, styles of cells are not kept"""
+        value = row[0] if row else None
+        if isinstance(value, Cell):
+            value = value.value
+        self.values.append(value)
+
+
+class TableWorkbook:
+    """Workbook-like container of table sheets used for reading and writing CSV and columnar files"""
+
+    def __init__(self, table_format: str = 'csv'):
+        if table_format not in OUTPUT_FORMATS or table_format == 'xlsx':
+            raise UnsupportedFileFormatException(f'Format {table_format} is not a table format.')
+        self.table_format = table_format
+        self._sheets: Dict[str, TableSheet] = {}
+
+    @property
+    def sheetnames(self) -> List[str]:
+        return list(self._sheets)
+
+    @property
+    def worksheets(self) -> List[TableSheet]:
+        return list(self._sheets.values())
+
+    def __getitem__(self, title: str) -> TableSheet:
+        return self._sheets[title]
+
+    def create_sheet(self, title: str) -> TableSheet:
+        sheet = self._sheets[title] = TableSheet(title)
+        return sheet
+
+    def close(self) -> None:
+        """Table is read into memory at once, nothing to close"""
+
+    def iter_records(self) -> Iterator[Tuple[str, Any]]:
+        for sheet in self._sheets.values():
+            for value in sheet.values:
+                yield sheet.title, value
+
+    @classmethod
+    def from_records(cls, records: Iterator[Tuple[str, Any]], table_format: str) -> 'TableWorkbook':
+        """Empty values are skipped as empty cells are"""
+        workbook = cls(table_format)
+        for section, value in records:
+            if section not in workbook._sheets:
+                workbook.create_sheet(section)
+            if value is not None and value != '':
+                workbook._sheets[section].values.append(value)
+        return workbook
+
+    @classmethod
+    def read_csv(cls, path: Path) -> 'TableWorkbook':
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None or tuple(header[:2]) != TABLE_COLUMNS:
+                raise UnsupportedFileFormatException(f'CSV file must have columns {", ".join(TABLE_COLUMNS)}.')
+            return cls.from_records(cls._iter_csv_records(reader), 'csv')
+
+    @staticmethod
+    def _iter_csv_records(reader: Any) -> Iterator[Tuple[str, str]]:
+        """Section and value of every non-empty row of csv reader"""
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < 2:
+                raise UnsupportedFileFormatException(
+                    f'CSV line {reader.line_num} must have columns {", ".join(TABLE_COLUMNS)}.'
+                )
+            yield row[0], row[1]
+
+    @classmethod
+    def read_arrow(cls, path: Path) -> 'TableWorkbook':
+        _check_pyarrow()
+        import pyarrow.feather
+        import pyarrow.parquet
+
+        if path.suffix.lower() == '.parquet':
+            table = pyarrow.parquet.read_table(path, columns=list(TABLE_COLUMNS))
+        else:
+            table = pyarrow.feather.read_table(path, columns=list(TABLE_COLUMNS))
+        sections = table.column('section').to_pylist()
+        values = table.column('value').to_pylist()
+        return cls.from_records(zip(sections, values), 'parquet')
+
+    def save(self, path: Path) -> None:
+        if self.table_format == 'csv':
+            self._write_csv(path)
+        else:
+            self._write_arrow(path)
+
+    def _write_csv(self, path: Path) -> None:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(TABLE_COLUMNS)
+            writer.writerows(self.iter_records())
+
+    def _write_arrow(self, path: Path) -> None:
+        _check_pyarrow()
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+
+        sections, values = [], []
+        for section, value in self.iter_records():
+            sections.append(section)
+            values.append(None if value is None else str(value))
+        table = pyarrow.table({
+            'section': pyarrow.array(sections, pyarrow.string()).dictionary_encode(),
+            'value': pyarrow.array(values, pyarrow.string()),
+        })
+        if path.suffix.lower() == '.parquet':
+            pyarrow.parquet.write_table(table, path)
+        else:
+            pyarrow.feather.write_feather(table, path)
+
+
+def _check_pyarrow() -> None:
+    if importlib.util.find_spec('pyarrow') is None:
+        raise UnsupportedFileFormatException('Parquet and Arrow formats require pyarrow, install em-sort[arrow].')
+
+
+def file_format(path: Path) -> str:
+    """Guesses one of OUTPUT_FORMATS by file suffix, unknown suffixes are treated as XLSX"""
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        return 'csv'
+    if suffix in ARROW_SUFFIXES:
+        return 'parquet'
+    return 'xlsx'
+
+
+def load_workbook(path: Path, preload: bool = False) -> Union[Workbook, TableWorkbook]:
+    """
+    Opens source file with backend chosen by file suffix, XLSX workbooks are opened read-only.
+
+    Read-only XLSX workbook reads sheets from disk lazily, with preload flag the whole file is read
+    into memory at once, so later parsing does not wait for disk.
+    """
+    source_format = file_format(path)
+    if source_format == 'csv':
+        return TableWorkbook.read_csv(path)
+    if source_format == 'parquet':
+        return TableWorkbook.read_arrow(path)
+    if preload:
+        return openpyxl.load_workbook(BytesIO(path.read_bytes()), read_only=True)
+    return openpyxl.load_workbook(path, read_only=True)
+
+
+def create_output_workbook(output_format: str, write_only: bool = False) -> Union[Workbook, TableWorkbook]:
+    if output_format not in OUTPUT_FORMATS:
+        raise UnsupportedFileFormatException(f'Output format {output_format} is not supported.')
+    if output_format == 'xlsx':
+        workbook = Workbook(write_only=write_only)
+        # remove created by default sheet
+        if not write_only:
+            workbook.remove(workbook.active)
+        return workbook
+    return TableWorkbook(output_format)
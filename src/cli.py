@@ -0,0 +1,197 @@
+# coding=utf-8
+"""
+Headless batch entry point, does not need GUI toolkit.
+
+Usage example:
+    python cli.py 'project/**/*.xlsx' -s 1,0 1,5 --jobs 8
+    python cli.py 'project/**/*.xlsx' --pipeline
+    python cli.py huge.xlsx --workers 4
+"""
+import argparse
+import asyncio
+import glob
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import freeze_support
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from backends import FORMAT_SUFFIXES, OUTPUT_FORMATS
+from diff import CHANGES_STEM_SUFFIX
+from pipeline import MERGED_VIEWS, FileResult, SortJob, run_pipeline
+from settings import DEFAULT_SETTINGS, Settings, load_settings
+from snapshot import SnapshotCache
+from sorter import Sorter
+from validation import REPORT_FORMATS
+
+
+def is_output_path(path: Path) -> bool:
+    """Sorted outputs, their side files and change sheets written by previous runs"""
+    if path.name.endswith(Sorter.SIDE_FILE_SUFFIXES):
+        return True
+    return path.suffix.lower() in FORMAT_SUFFIXES.values() \
+        and path.stem.endswith((Sorter.SORTED_STEM_SUFFIX, CHANGES_STEM_SUFFIX))
+
+
+def expand_paths(patterns: Iterable[str]) -> List[Path]:
+    """
+    Expands glob patterns skipping outputs of previous runs, plain paths are kept as is even if they do not exist.
+
+    Duplicates are dropped, paths keep order of their first occurrence.
+    """
+    paths: Dict[Path, None] = {}
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = [Path(match) for match in sorted(glob.glob(pattern, recursive=True))]
+            paths.update((path, None) for path in matches if not is_output_path(path))
+        else:
+            paths[Path(pattern)] = None
+    return list(paths)
+
+
+def sort_file(path: Path, **options) -> None:
+    """Sorts one workbook running all SortJob stages in a row, see SortJob for options"""
+    job = SortJob(path, **options)
+    job.load()
+    job.process()
+    job.save()
+
+
+def _sort_file_timed(path: Path, options: dict) -> FileResult:
+    started = time.perf_counter()
+    try:
+        sort_file(path, **options)
+    except Exception as e:  # one broken workbook should not stop the whole batch
+        return FileResult(path, time.perf_counter() - started, f'{type(e).__name__}: {e}')
+    return FileResult(path, time.perf_counter() - started)
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be a positive integer, got {value}')
+    return number
+
+
+def non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f'must not be negative, got {value}')
+    return number
+
+
+def build_settings_parser() -> argparse.ArgumentParser:
+    """Settings option is parsed first, because it defines choices of other options"""
+    settings_parser = argparse.ArgumentParser(add_help=False)
+    settings_parser.add_argument(
+        '--settings', type=Path, help='JSON file with marker grammar and wire sections, user settings by default'
+    )
+    return settings_parser
+
+
+def build_arg_parser(settings: Settings = DEFAULT_SETTINGS) -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(
+        prog='em-sort', description='Sorts wire markers in many workbooks.', parents=[build_settings_parser()]
+    )
+    arg_parser.add_argument('files', nargs='+', help='workbook paths or glob patterns')
+    arg_parser.add_argument(
+        '-s', '--sections', nargs='+', choices=settings.wire_sections,
+        help='wire sections to sort, all sections by default'
+    )
+    arg_parser.add_argument('--in-place', action='store_true', help='overwrite source files')
+    arg_parser.add_argument('-j', '--jobs', type=positive_int, default=1, help='number of files processed concurrently')
+    arg_parser.add_argument(
+        '-w', '--workers', type=non_negative_int, default=1,
+        help='worker processes sorting devices of one file, 0 means all CPUs'
+    )
+    arg_parser.add_argument(
+        '--pipeline', action='store_true',
+        help='read next file from disk while sorting current one in one process, ignores --jobs'
+    )
+    arg_parser.add_argument('--queue-size', type=positive_int, default=1, help='files waiting between pipeline stages')
+    arg_parser.add_argument('--natural', action='store_true', help="numeric-aware ordering: 'X2' before 'X10'")
+    arg_parser.add_argument('--incremental', action='store_true', help='sort only devices changed since last run')
+    arg_parser.add_argument('--report', action='store_true', help='write JSON run report next to every output file')
+    arg_parser.add_argument('--trace-memory', action='store_true', help='record allocation peaks in run report')
+    arg_parser.add_argument('--profile', action='store_true', help='write cProfile stats next to run report')
+    arg_parser.add_argument('--snapshot-cache', type=Path, help='directory of parsed workbooks cache')
+    arg_parser.add_argument('--snapshot-cache-size', type=int, default=1024, help='cache size limit in megabytes')
+    arg_parser.add_argument(
+        '--cross-check', action='store_true', help='write duplicated and conflicting wires next to every output file'
+    )
+    arg_parser.add_argument(
+        '--merged', choices=MERGED_VIEWS,
+        help='add sheets with wires of every device merged across sorted sections, one sheet per device or one sheet'
+    )
+    arg_parser.add_argument(
+        '--validate', choices=REPORT_FORMATS,
+        help='write all problems of source file next to output file, file with errors is not sorted'
+    )
+    arg_parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='xlsx', help='output file format')
+    arg_parser.add_argument(
+        '--max-wires-in-memory', type=positive_int,
+        help='sort huge devices externally keeping at most this many wires in memory'
+    )
+    return arg_parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    settings_args, _ = build_settings_parser().parse_known_args(argv)
+    settings = load_settings(settings_args.settings)
+    arg_parser = build_arg_parser(settings)
+    args = arg_parser.parse_args(argv)
+    if args.merged is not None and args.max_wires_in_memory is not None:
+        arg_parser.error("--merged holds merged devices in memory whole, it can't be used with --max-wires-in-memory")
+    if args.max_wires_in_memory is not None and (args.incremental or args.workers != 1):
+        arg_parser.error("external sort is serial and not incremental, --max-wires-in-memory can't be used "
+                         "with --incremental or --workers")
+    if args.merged is not None and args.output_format != 'xlsx':
+        arg_parser.error('--merged writes section of every marker next to it, it needs xlsx output format')
+    if args.trace_memory and args.pipeline:
+        arg_parser.error("memory tracing is global to the process, --trace-memory can't be used with --pipeline")
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(name)s: %(message)s')
+    paths = expand_paths(args.files)
+    options = dict(
+        sections=args.sections,
+        in_place=args.in_place,
+        natural_order=args.natural,
+        incremental=args.incremental,
+        report=args.report or args.trace_memory or args.profile,
+        trace_memory=args.trace_memory,
+        profile=args.profile,
+        snapshot_cache=None if args.snapshot_cache is None else SnapshotCache(
+            args.snapshot_cache, max_bytes=args.snapshot_cache_size * 2 ** 20
+        ),
+        max_wires_in_memory=args.max_wires_in_memory,
+        output_format=args.output_format,
+        cross_check=args.cross_check,
+        merged=args.merged,
+        validate=args.validate,
+        settings=settings,
+        workers=args.workers or None,
+    )
+
+    started = time.perf_counter()
+    if args.pipeline:
+        results = asyncio.run(run_pipeline(paths, options, queue_size=args.queue_size))
+    elif args.jobs == 1:
+        results = [_sort_file_timed(path, options) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(_sort_file_timed, paths, [options] * len(paths)))
+
+    for result in results:
+        status = 'OK' if result.error is None else f'FAILED {result.error}'
+        print(f'{result.elapsed:8.2f}s  {result.path}  {status}')
+
+    failed = sum(result.error is not None for result in results)
+    print(f'{len(results)} files, {len(results) - failed} sorted, {failed} failed '
+          f'in {time.perf_counter() - started:.2f}s')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# coding=utf-8
+"""
+Wire cross-reference check.
+
+All wires of schematic are indexed in one pass by wire name and by sorted pair of endpoint addresses,
+conflicts are found in the built hash tables, so the check takes linear time:
+    'duplicate'      the same physical wire is listed more than once in one section,
+                     e.g. under two devices;
+    'cross_section'  the same physical wire is listed in different wire sections;
+    'name_reused'    wires with the same name are not connected with each other,
+                     so one name is used for unrelated device pairs. Connections of one contact,
+                     e.g. both sides of terminal 'X2:14:1' and 'X2:14:2', are treated as connected.
+Wires with markers of unsupported format are skipped.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from entities import Marker, Schematic, Wire
+
+CONFLICT_KINDS = ('duplicate', 'cross_section', 'name_reused')
+
+Endpoints = Tuple[str, str]
+
+
+class WireOccurrence(NamedTuple):
+    section: str
+    device: str
+    wire_name: str
+    markers: Tuple[str, str]
+
+
+class Conflict(NamedTuple):
+    kind: str
+    key: str
+    occurrences: Tuple[WireOccurrence, ...]
+
+    def as_dict(self) -> dict:
+        return {
+            'kind': self.kind,
+            'key': self.key,
+            'occurrences': [
+                {**occurrence._asdict(), 'markers': list(occurrence.markers)} for occurrence in self.occurrences
+            ],
+        }
+
+
+def _ordered(first: str, second: str) -> Endpoints:
+    return (first, second) if first <= second else (second, first)
+
+
+def wire_endpoints(wire: Wire) -> Endpoints:
+    """Addresses of both wire ends in the same order for both wire directions"""
+    return _ordered(wire.frm.address, wire.to.address)
+
+
+def contact_address(marker: Marker) -> str:
+    """Address of marker without connection, all connections of one contact share it"""
+    contact = marker.tokenizer.jack_sep.join([marker.jack, marker.contact]) if marker.jack else marker.contact
+    return marker.tokenizer.address_sep.join([marker.device, contact])
+
+
+class CrossReference:
+    """Hash index of schematic wires by endpoints and by wire name"""
+
+    def __init__(self):
+        self.by_endpoints: Dict[Endpoints, List[WireOccurrence]] = {}
+        self.by_name: Dict[str, Dict[Endpoints, WireOccurrence]] = {}
+
+    @classmethod
+    def from_schematic(cls, schematic: Schematic) -> 'CrossReference':
+        cross_reference = cls()
+        for section, devices in schematic.content.items():
+            for device in devices:
+                cross_reference.add_wires(section, device.name, device.wires)
+        return cross_reference
+
+    def add_wires(self, section: str, device_name: str, wires: Iterable[Wire]) -> None:
+        for wire in wires:
+            if wire.frm.unsupported_format or wire.to.unsupported_format:
+                continue
+            endpoints = wire_endpoints(wire)
+            occurrence = WireOccurrence(section, device_name, wire.frm.wire_name, wire.markers)
+            self.by_endpoints.setdefault(endpoints, []).append(occurrence)
+            if wire.frm.wire_name is not None:
+                contacts = _ordered(contact_address(wire.frm), contact_address(wire.to))
+                self.by_name.setdefault(wire.frm.wire_name, {}).setdefault(contacts, occurrence)
+
+    def iter_endpoint_conflicts(self) -> Iterable[Conflict]:
+        for endpoints, occurrences in self.by_endpoints.items():
+            if len(occurrences) == 1:
+                continue
+            key = ' - '.join(endpoints)
+            by_section: Dict[str, List[WireOccurrence]] = {}
+            for occurrence in occurrences:
+                by_section.setdefault(occurrence.section, []).append(occurrence)
+            for section_occurrences in by_section.values():
+                if len(section_occurrences) > 1:
+                    yield Conflict('duplicate', key, tuple(section_occurrences))
+            if len(by_section) > 1:
+                yield Conflict('cross_section', key, tuple(occurrences))
+
+    def iter_name_conflicts(self) -> Iterable[Conflict]:
+        for wire_name, wires in self.by_name.items():
+            if len(wires) > 1 and self._count_connected_groups(wires) > 1:
+                yield Conflict('name_reused', wire_name, tuple(wires.values()))
+
+    @staticmethod
+    def _count_connected_groups(wires: Iterable[Endpoints]) -> int:
+        """Union-find over wire ends, wires sharing an address belong to one group"""
+        parents: Dict[str, str] = {}
+
+        def find(address: str) -> str:
+            root = address
+            while parents[root] != root:
+                root = parents[root]
+            while parents[address] != root:
+                parents[address], address = root, parents[address]
+            return root
+
+        groups = 0
+        for first, second in wires:
+            for address in (first, second):
+                if address not in parents:
+                    parents[address] = address
+                    groups += 1
+            first_root, second_root = find(first), find(second)
+            if first_root != second_root:
+                parents[first_root] = second_root
+                groups -= 1
+        return groups
+
+    def conflicts(self) -> List[Conflict]:
+        return [*self.iter_endpoint_conflicts(), *self.iter_name_conflicts()]
+
+
+def find_conflicts(schematic: Schematic) -> List[Conflict]:
+    return CrossReference.from_schematic(schematic).conflicts()
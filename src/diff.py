@@ -0,0 +1,180 @@
+# coding=utf-8
+"""
+Diff of two sorted outputs.
+
+Wires of both workbooks are grouped by section and device and keyed by their marker labels, label of marker
+holds its wire name and endpoint address, so the pair of labels identifies wire with its direction.
+Wires are matched with hash joins per device, unchanged devices are compared as plain lists:
+    'added'    wire is only in the current output;
+    'removed'  wire is only in the previous output;
+    'moved'    wire is in both outputs but changed its place relative to other common wires,
+               the fewest such wires are reported, see _moved_positions.
+
+Usage example:
+    python diff.py project_sorted_v1.xlsx project_sorted_v2.xlsx -o changes.xlsx
+"""
+import argparse
+import sys
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from openpyxl import Workbook
+
+from backends import load_workbook
+from parser import Parser
+from settings import DEFAULT_SETTINGS, Settings, load_settings
+from utils import pairwise
+
+CHANGE_KINDS = ('added', 'removed', 'moved')
+CHANGES_SHEET_TITLE = 'Changes'
+CHANGES_STEM_SUFFIX = '_changes'
+
+DeviceKey = Tuple[str, str]
+WirePair = Tuple[str, str]
+
+
+class WireChange(NamedTuple):
+    section: str
+    device: str
+    change: str
+    wire: str
+    # 1-based places of wire in device of previous and current output
+    old_position: Optional[int]
+    new_position: Optional[int]
+
+
+def read_sorted_devices(path: Path, settings: Settings = DEFAULT_SETTINGS) -> Dict[DeviceKey, List[WirePair]]:
+    """Marker pairs of every device of supported sections in workbook order, repeated devices are joined"""
+    workbook = load_workbook(path)
+    parser = Parser(workbook, {}, settings)
+    devices: Dict[DeviceKey, List[WirePair]] = {}
+    try:
+        for section in workbook.sheetnames:
+            if section not in settings.wire_sections:
+                continue
+            for block in parser.iter_sheet_blocks(section):
+                devices.setdefault((section, block.name), []).extend(pairwise(block.markers))
+    finally:
+        workbook.close()
+    return devices
+
+
+def _occurrence_keys(wires: Iterable[WirePair]) -> List[Tuple[WirePair, int]]:
+    """Numbers repeated wires of device, so every wire has unique key"""
+    seen: Dict[WirePair, int] = {}
+    keys = []
+    for wire in wires:
+        number = seen[wire] = seen.get(wire, -1) + 1
+        keys.append((wire, number))
+    return keys
+
+
+def _moved_positions(old_positions: Sequence[int]) -> Set[int]:
+    """
+    Old positions of wires that moved, given old positions of common wires in current order.
+
+    Longest increasing subsequence of positions keeps its relative order, everything else moved.
+    """
+    tails: List[int] = []
+    tail_indexes: List[int] = []
+    previous: List[int] = [-1] * len(old_positions)
+    for index, position in enumerate(old_positions):
+        place = bisect_left(tails, position)
+        if place == len(tails):
+            tails.append(position)
+            tail_indexes.append(index)
+        else:
+            tails[place] = position
+            tail_indexes[place] = index
+        previous[index] = tail_indexes[place - 1] if place else -1
+
+    kept: Set[int] = set()
+    index = tail_indexes[-1] if tail_indexes else -1
+    while index != -1:
+        kept.add(old_positions[index])
+        index = previous[index]
+    return set(old_positions) - kept
+
+
+def diff_device(section: str, device: str, old: List[WirePair], new: List[WirePair]) -> Iterator[WireChange]:
+    if old == new:
+        return
+    old_keys, new_keys = _occurrence_keys(old), _occurrence_keys(new)
+    old_index = {key: position for position, key in enumerate(old_keys)}
+    new_index = {key: position for position, key in enumerate(new_keys)}
+
+    for position, key in enumerate(old_keys):
+        if key not in new_index:
+            yield WireChange(section, device, 'removed', ' -> '.join(key[0]), position + 1, None)
+
+    common: List[int] = []
+    for position, key in enumerate(new_keys):
+        old_position = old_index.get(key)
+        if old_position is None:
+            yield WireChange(section, device, 'added', ' -> '.join(key[0]), None, position + 1)
+        else:
+            common.append(old_position)
+
+    moved = _moved_positions(common)
+    for position, key in enumerate(new_keys):
+        old_position = old_index.get(key)
+        if old_position in moved:
+            yield WireChange(section, device, 'moved', ' -> '.join(key[0]), old_position + 1, position + 1)
+
+
+def diff_devices(
+        old_devices: Dict[DeviceKey, List[WirePair]], new_devices: Dict[DeviceKey, List[WirePair]]
+) -> List[WireChange]:
+    """Changes of devices of current output in its order, then of devices missing in it"""
+    changes: List[WireChange] = []
+    for (section, device), wires in new_devices.items():
+        changes.extend(diff_device(section, device, old_devices.get((section, device), []), wires))
+    for (section, device), wires in old_devices.items():
+        if (section, device) not in new_devices:
+            changes.extend(diff_device(section, device, wires, []))
+    return changes
+
+
+def diff_sorted_files(old_path: Path, new_path: Path, settings: Settings = DEFAULT_SETTINGS) -> List[WireChange]:
+    return diff_devices(read_sorted_devices(old_path, settings), read_sorted_devices(new_path, settings))
+
+
+def write_changes(changes: Iterable[WireChange], path: Path) -> None:
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(CHANGES_SHEET_TITLE)
+    worksheet.append(list(WireChange._fields))
+    for change in changes:
+        worksheet.append(list(change))
+    workbook.save(path)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(prog='em-sort-diff', description='Compares two sorted workbooks.')
+    arg_parser.add_argument('previous', type=Path, help='sorted workbook of previous release')
+    arg_parser.add_argument('current', type=Path, help='sorted workbook to compare with it')
+    arg_parser.add_argument(
+        '-o', '--output', type=Path, help='change sheet path, <current>_changes.xlsx next to current by default'
+    )
+    arg_parser.add_argument(
+        '--settings', type=Path, help='JSON file with marker grammar and wire sections, user settings by default'
+    )
+    return arg_parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Writes change sheet, exit code is 1 when outputs differ as with diff utility"""
+    args = build_arg_parser().parse_args(argv)
+    output_path = args.output or args.current.with_name(f'{args.current.stem}{CHANGES_STEM_SUFFIX}.xlsx')
+    changes = diff_sorted_files(args.previous, args.current, load_settings(args.settings))
+    write_changes(changes, output_path)
+
+    counts = {kind: 0 for kind in CHANGE_KINDS}
+    for change in changes:
+        counts[change.change] += 1
+    print(', '.join(f'{count} {kind}' for kind, count in counts.items()) + f' wires, see {output_path}')
+    return 1 if changes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,24 @@
 # coding=utf-8
-from typing import List, Tuple, Optional
+import heapq
+from sys import intern
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 
 from exceptions import UnsupportedMarkerFormatException, InvalidMarkersPairException
+from tokenizer import MarkerTokenizer, MarkerTokens
+from utils import cached_natural_key, natural_key
+
+
+LOWEST_NATURAL_PRIORITY = 0, natural_key(''), natural_key(''), natural_key('')
 
 
 class Marker:
-    # FIXME: make loading this constants from settings
-    WIRE_SEP = ' '
-    ADDRESS_SEP = ':'
-    JACK_SEP = '-'
+    # default grammar of labels, markers parsed with other settings refer to tokenizer of their grammar
+    TOKENIZER = MarkerTokenizer(' ', ':', '-')
+
+    # markers are the most numerous objects, so they are kept without per-instance __dict__
+    __slots__ = ('label', 'wire_name', 'device', 'jack', 'contact', 'connection', 'unsupported_format', 'tokenizer')
 
-    def __init__(self, label: str):
+    def __init__(self, label: str, tokenizer: MarkerTokenizer = TOKENIZER):
         self.label = label
         self.wire_name: Optional[str] = None
         self.device: Optional[str] = None
@@ -18,6 +26,7 @@ class Marker:
         self.contact: Optional[str] = None
         self.connection: Optional[str] = None
         self.unsupported_format = False
+        self.tokenizer = tokenizer
 
     def parse(self):
         """
@@ -27,41 +36,27 @@ class Marker:
                                 'A1:GND2'
                                 'PE:PE'
         """
-        if self.label.count(self.WIRE_SEP) == 1:
-            address, self.wire_name = self.label.split(self.WIRE_SEP)
-        elif self.label.count(self.WIRE_SEP) == 0:
-            address = self.label
-        else:
-            self.unsupported_format = True
+        self.apply_tokens(self.tokenizer.tokenize(self.label))
+        if self.unsupported_format:
             raise UnsupportedMarkerFormatException(f'Parsing failed on marker with label: {repr(self.label)}')
+        return self
 
-        if self.label.count(self.ADDRESS_SEP) == 1:
-            self.device, self.contact = address.split(self.ADDRESS_SEP)
-        elif self.label.count(self.ADDRESS_SEP) == 2:
-            self.device, self.contact, self.connection = address.split(self.ADDRESS_SEP)
-        else:
-            self.unsupported_format = True
-            raise UnsupportedMarkerFormatException
-
-        if self.contact.count(self.JACK_SEP) == 1:
-            self.jack, self.contact = self.contact.split(self.JACK_SEP)
-            # check that self.jack and self.contact contains useful information
-            if not self.jack or not self.contact:
-                self.unsupported_format = True
-                raise UnsupportedMarkerFormatException
+    def apply_tokens(self, tokens: MarkerTokens):
+        """Fills marker attributes with tokens of its label, does not raise on unsupported format"""
+        self.wire_name, self.device, self.jack, self.contact, self.connection, self.unsupported_format = tokens
         return self
 
     @property
     def address(self) -> str:
         if self.jack:
-            address_params = [self.device, self.JACK_SEP.join([self.jack, self.contact])]
+            address_params = [self.device, self.tokenizer.jack_sep.join([self.jack, self.contact])]
         else:
             address_params = [self.device, self.contact]
 
         if self.connection:
             address_params.append(self.connection)
 
-        return self.ADDRESS_SEP.join(address_params)
+        return self.tokenizer.address_sep.join(address_params)
 
     def __repr__(self) -> str:
         marker_repr = repr(self.label)
@@ -71,7 +66,7 @@ class Marker:
         marker_data = [self.address]
         if self.wire_name:
             marker_data.append(self.wire_name)
-        return self.WIRE_SEP.join(marker_data)
+        return self.tokenizer.wire_sep.join(marker_data)
 
     def __hash__(self):
         return hash((self.label, self.wire_name, self.device, self.jack, self.contact, self.connection))
@@ -91,12 +86,14 @@ class Wire:
     Wire can connect two different devices with different or same contacts
     or two different contacts from same device. Wire can contain only markers with equal wire names.
     """
+    __slots__ = ('frm', 'to', 'section')
 
     def __init__(self, frm: Marker, to: Marker, section: str):
         self.frm = frm
         self.to = to
         self._validate()
-        self.section = section
+        # all wires of one section refer to the same string object
+        self.section = intern(section)
 
     @property
     def name(self) -> str:
@@ -126,6 +123,8 @@ class Wire:
 
 
 class Device:
+    __slots__ = ('name', 'wires')
+
     def __init__(self, name: str):
         self.name = name
         self.wires: List[Wire] = []
@@ -143,10 +142,36 @@ class Device:
             return is_internal, wire.frm.jack, wire.to.device, wire.frm.contact
         return is_internal, wire.to.device, wire.frm.wire_name, wire.frm.contact
 
-    def sort(self):
-        self.wires = sorted(self.wires, key=self._get_sorting_priority)
+    @staticmethod
+    def _get_natural_sorting_priority(wire: Wire) -> Tuple[int, tuple, tuple, tuple]:
+        """Same priority as _get_sorting_priority but names and contacts are compared numeric-aware"""
+        frm, to = wire.frm, wire.to
+        if frm.unsupported_format or to.unsupported_format:
+            return LOWEST_NATURAL_PRIORITY
+        is_internal = 1 if frm.device == to.device else 0
+        if frm.jack:
+            return is_internal, cached_natural_key(frm.jack), cached_natural_key(to.device), \
+                cached_natural_key(frm.contact)
+        return is_internal, cached_natural_key(to.device), natural_key(frm.wire_name), cached_natural_key(frm.contact)
+
+    def sort(self, natural: bool = False):
+        key = self._get_natural_sorting_priority if natural else self._get_sorting_priority
+        self.wires = sorted(self.wires, key=key)
         return self
 
+    @classmethod
+    def merge(cls, name: str, devices: Iterable['Device'], natural: bool = False) -> 'Device':
+        """
+        Combines wires of sorted devices, e.g. blocks of one device from different sections, into one device.
+
+        Wires are merged with k-way merge by sorting priority without sorting them again,
+        wires with equal priority keep order of devices.
+        """
+        key = cls._get_natural_sorting_priority if natural else cls._get_sorting_priority
+        merged = cls(name)
+        merged.wires = list(heapq.merge(*(device.wires for device in devices), key=key))
+        return merged
+
     @property
     def markers(self) -> List[Marker]:
         markers = []
@@ -154,6 +179,10 @@ class Device:
             markers.extend(wire.markers)
         return markers
 
+    @property
+    def markers_count(self) -> int:
+        return len(self.wires) * 2
+
     def __repr__(self) -> str:
         return f'Device(name={repr(self.name)}, wires={self.wires}'
 
@@ -163,31 +192,193 @@ class Device:
         return self.wires == other.wires and self.name == other.name
 
 
+class SectionIndex:
+    """
+    Lookup tables of devices and wires of one wire section.
+
+    Index keeps the indexed list and its length, so list replaced or resized behind the index is detected.
+    """
+    __slots__ = ('devices', 'wires', 'device_pairs', 'source', 'size')
+
+    def __init__(self, devices: List[Device]):
+        self.devices: Dict[str, List[Device]] = {}
+        self.wires: Dict[str, List[Wire]] = {}
+        self.device_pairs: Dict[Tuple[str, str], List[Wire]] = {}
+        self.source = devices
+        self.size = 0
+        self.add(devices)
+
+    def add(self, devices: Iterable[Device]) -> None:
+        """Indexes devices appended to the end of indexed list"""
+        for device in devices:
+            self.devices.setdefault(device.name, []).append(device)
+            for wire in device.wires:
+                if wire.frm.wire_name is not None:
+                    self.wires.setdefault(wire.frm.wire_name, []).append(wire)
+                if wire.frm.device is not None and wire.to.device is not None:
+                    pair = Schematic.device_pair(wire.frm.device, wire.to.device)
+                    self.device_pairs.setdefault(pair, []).append(wire)
+            self.size += 1
+
+    def is_current(self, devices: List[Device]) -> bool:
+        return self.source is devices and self.size == len(devices)
+
+
+class SchematicContent(dict):
+    """
+    Devices of schematic by wire section.
+
+    Replacing section drops its index, index of section is rebuilt on the next lookup. Devices added to or removed
+    from section list in place are detected by list length. Devices replaced in place and wires changed inside
+    devices are not tracked, section has to be assigned again. Copies are not bound to any schematic.
+    """
+
+    def __init__(self, schematic: Optional['Schematic'], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._schematic = schematic
+
+    def _drop_index(self, section: str) -> None:
+        if self._schematic is not None:
+            self._schematic._section_indexes.pop(section, None)
+
+    def __setitem__(self, section: str, devices: List[Device]) -> None:
+        super().__setitem__(section, devices)
+        self._drop_index(section)
+
+    def __delitem__(self, section: str) -> None:
+        super().__delitem__(section)
+        self._drop_index(section)
+
+    def update(self, *args, **kwargs) -> None:
+        for section, devices in dict(*args, **kwargs).items():
+            self[section] = devices
+
+    def __ior__(self, other) -> 'SchematicContent':
+        self.update(other)
+        return self
+
+    def setdefault(self, section: str, devices: Optional[List[Device]] = None) -> List[Device]:
+        if section not in self:
+            self[section] = [] if devices is None else devices
+        return self[section]
+
+    def pop(self, section: str, *default):
+        self._drop_index(section)
+        return super().pop(section, *default)
+
+    def popitem(self):
+        section, devices = super().popitem()
+        self._drop_index(section)
+        return section, devices
+
+    def clear(self) -> None:
+        super().clear()
+        if self._schematic is not None:
+            self._schematic._section_indexes.clear()
+
+    def __reduce__(self):
+        # items are restored before attributes while unpickling, so copies are built detached from schematic
+        return self.__class__, (None, dict(self))
+
+
 class Schematic:
     def __init__(self):
-        self.content = {}
+        self._section_indexes: Dict[str, SectionIndex] = {}
+        self._content = SchematicContent(self)
+
+    @property
+    def content(self) -> SchematicContent:
+        return self._content
+
+    @content.setter
+    def content(self, content: Dict[str, List[Device]]) -> None:
+        self._section_indexes.clear()
+        self._content = SchematicContent(self, content)
 
     def add_devices(self, devices: List[Device], section: str) -> None:
         """add devices with exact wire section"""
         self.content[section] = devices
 
+    @staticmethod
+    def device_pair(first: str, second: str) -> Tuple[str, str]:
+        return (first, second) if first <= second else (second, first)
+
+    def extend_section(self, section: str, devices: Iterable[Device]) -> None:
+        """Appends devices to section, index of section is updated instead of being rebuilt"""
+        section_devices = self.content.setdefault(section, [])
+        index = self._section_indexes.get(section)
+        is_current = index is not None and index.is_current(section_devices)
+        section_devices.extend(devices)
+        if is_current:
+            index.add(section_devices[index.size:])
+
+    def _index(self, section: str) -> SectionIndex:
+        devices = self.content[section]
+        index = self._section_indexes.get(section)
+        if index is None or not index.is_current(devices):
+            index = self._section_indexes[section] = SectionIndex(devices)
+        return index
+
+    def iter_devices(self) -> Iterator[Device]:
+        for section_devices in self.content.values():
+            yield from section_devices
+
+    def iter_wires(self) -> Iterator[Wire]:
+        for device in self.iter_devices():
+            yield from device.wires
+
     @property
     def all_devices(self) -> List[Device]:
-        all_devices = []
-        for section_devices in self.content.values():
-            all_devices.extend(section_devices)
-        return all_devices
+        return list(self.iter_devices())
 
     @property
     def all_wires(self) -> List[Wire]:
-        all_wires = []
-        for device in self.all_devices:
-            all_wires.extend(device.wires)
-        return all_wires
+        return list(self.iter_wires())
+
+    def get_devices(self, name: str) -> List[Device]:
+        """Devices with exact name, e.g. 'Device X2', from all sections"""
+        devices = []
+        for section in self.content:
+            devices.extend(self._index(section).devices.get(name, ()))
+        return devices
+
+    def iter_merged_devices(self, sections: Optional[Iterable[str]] = None, natural: bool = False) -> Iterator[Device]:
+        """
+        Yields every device with wires of all its blocks from given sections, None means all sections.
+
+        Blocks have to be sorted, devices are yielded in order of their first appearance.
+        """
+        sections = list(self.content if sections is None else sections)
+        names: Dict[str, None] = {}
+        for section in sections:
+            names.update(dict.fromkeys(self._index(section).devices))
+        for name in names:
+            yield self.get_merged_device(name, sections, natural)
+
+    def get_merged_device(self, name: str, sections: Optional[Iterable[str]] = None, natural: bool = False) -> Device:
+        """Device with exact name, e.g. 'Device X2', with wires of all its sorted blocks merged"""
+        sections = self.content if sections is None else sections
+        blocks = []
+        for section in sections:
+            blocks.extend(self._index(section).devices.get(name, ()))
+        return Device.merge(name, blocks, natural)
 
     def get_all_device_wires(self, name: str):
         device_wires = []
-        for device in self.all_devices:
-            if device.name == f'Device {name}':
-                device_wires.extend(device.wires)
+        for device in self.get_devices(f'Device {name}'):
+            device_wires.extend(device.wires)
         return device_wires
+
+    def get_wires_by_name(self, wire_name: str) -> List[Wire]:
+        wires = []
+        for section in self.content:
+            wires.extend(self._index(section).wires.get(wire_name, ()))
+        return wires
+
+    def get_wires_between(self, first_device: str, second_device: str) -> List[Wire]:
+        """Wires connecting two devices in any direction, e.g. 'A1' and 'X2'"""
+        pair = self.device_pair(first_device, second_device)
+        wires = []
+        for section in self.content:
+            wires.extend(self._index(section).device_pairs.get(pair, ()))
+        return wires
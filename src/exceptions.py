@@ -16,3 +16,27 @@ class InvalidMarkersPairException(EMSortException):
 
 class SheetDoesNotExistsException(EMSortException):
     pass
+
+
+class SortingCancelledException(EMSortException):
+    pass
+
+
+class UnsupportedFileFormatException(EMSortException):
+    pass
+
+
+class InvalidSettingsException(EMSortException):
+    pass
+
+
+class InvalidWorkbookException(EMSortException):
+    pass
+
+
+class IncompatibleOptionsException(EMSortException):
+    pass
+
+
+class InvalidOptionException(EMSortException):
+    pass
@@ -0,0 +1,139 @@
+# coding=utf-8
+"""
+External sort of device wires.
+
+Wires of device are parsed and sorted in chunks of bounded size, every sorted chunk (run) is spilled
+to temporary file in blocks of records. Runs are merged with streaming k-way merge when markers of device
+are requested, so only one chunk of wires or one block of records per merged run are kept in memory.
+Blocks are sized from the wires limit and runs are merged in passes of bounded fan-in first, so the memory
+taken by merge does not grow with quantity of runs. Merged runs are appended to the same run file.
+All runs are read through one shared file handle, so quantity of runs is not bounded by limit of open files.
+"""
+import heapq
+import pickle
+from itertools import islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+from entities import Marker, Wire
+from parser import Parser
+from tokenizer import MarkerTokenizer
+
+# sort key, label of 'from' marker, label of 'to' marker
+RunRecord = Tuple[Any, str, str]
+
+
+class RunFile:
+    """Append-only file with sorted runs of records pickled in blocks"""
+    BLOCK_SIZE = 256
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._reader = None
+
+    def write_run(self, records: Iterable[RunRecord], block_size: int = BLOCK_SIZE) -> Tuple[int, int]:
+        """Returns offset and quantity of records of written run, records are read back by blocks of block_size"""
+        offset = self._file.tell()
+        count = 0
+        records = iter(records)
+        while True:
+            block = list(islice(records, block_size))
+            if not block:
+                break
+            pickle.dump(block, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            count += len(block)
+        self._file.flush()
+        return offset, count
+
+    def read_run(self, offset: int, count: int) -> Iterator[RunRecord]:
+        """Runs may be read simultaneously, shared handle is positioned before reading of every block"""
+        if self._reader is None:
+            self._reader = open(self.path, 'rb')
+        while count > 0:
+            self._reader.seek(offset)
+            block = pickle.load(self._reader)
+            offset = self._reader.tell()
+            count -= len(block)
+            yield from block
+
+    def close(self) -> None:
+        self._file.close()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+def merge_runs(run_file: RunFile, runs: List[Tuple[int, int]]) -> Iterator[RunRecord]:
+    """Records of runs in sorted order, merge is stable: equal keys keep order of runs"""
+    return heapq.merge(*(run_file.read_run(offset, count) for offset, count in runs), key=itemgetter(0))
+
+
+class ExternalDevice:
+    """Device which sorted wires are stored as runs in run file, markers are merged on every request"""
+    __slots__ = ('name', 'section', 'markers_count', '_run_file', '_runs', '_tokenizer')
+
+    def __init__(
+            self, name: str, section: str, run_file: RunFile, runs: List[Tuple[int, int]],
+            tokenizer: MarkerTokenizer = Marker.TOKENIZER,
+    ):
+        self.name = name
+        self.section = section
+        self.markers_count = sum(count for _, count in runs) * 2
+        self._run_file = run_file
+        self._runs = runs
+        self._tokenizer = tokenizer
+
+    @property
+    def markers(self) -> Iterator[str]:
+        """Markers in sorted order, runs are merged lazily"""
+        # stable merge gives the same order as sorting of all wires at once
+        for _, label_from, label_to in merge_runs(self._run_file, self._runs):
+            yield label_from
+            yield label_to
+
+    @property
+    def wires(self) -> List[Wire]:
+        return Parser._parse_device(self.name, list(self.markers), self.section, self._tokenizer).wires
+
+    def sort(self, natural: bool = False):
+        """Device is already sorted"""
+        return self
+
+    def __repr__(self) -> str:
+        return f'ExternalDevice(name={repr(self.name)}, runs={self._runs})'
+
+
+def sort_device_external(
+        device_name: str,
+        markers: Iterable[str],
+        wire_section: str,
+        run_file: RunFile,
+        max_wires: int,
+        key: Callable[[Wire], Any],
+        tokenizer: MarkerTokenizer = Marker.TOKENIZER,
+) -> ExternalDevice:
+    """
+    Parses and sorts device wires by chunks of max_wires wires and spills sorted runs to run file.
+
+    Runs are merged in passes until blocks of all left runs together take at most max_wires records.
+    """
+    block_size = max(1, min(RunFile.BLOCK_SIZE, max_wires // 2))
+    fan_in = max(2, max_wires // block_size)
+    markers = iter(markers)
+    runs = []
+    while True:
+        chunk = list(islice(markers, max_wires * 2))
+        if not chunk:
+            break
+        wires = sorted(Parser._parse_device(device_name, chunk, wire_section, tokenizer).wires, key=key)
+        runs.append(run_file.write_run(((key(wire), wire.frm.label, wire.to.label) for wire in wires), block_size))
+    while len(runs) > fan_in:
+        # consecutive runs are merged, so merge stays stable
+        runs = [
+            run_file.write_run(merge_runs(run_file, runs[start:start + fan_in]), block_size)
+            for start in range(0, len(runs), fan_in)
+        ]
+    return ExternalDevice(device_name, wire_section, run_file, runs, tokenizer)
+
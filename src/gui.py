@@ -1,41 +1,68 @@
+import os
+import threading
 from pathlib import Path
+from typing import List, Optional, Sequence
 
 import PySimpleGUI as sg
-import openpyxl
 
+from exceptions import SortingCancelledException
+from snapshot import SnapshotCache
 from sorter import Sorter
-from utils import resource_path
+from utils import resource_path, user_cache_dir
 
 ASSETS_DIR = resource_path('assets')
 
 
 class GUI:
     THEME = 'Dark Amber'
-    LAYOUT = [
-        [sg.Image(filename=Path(ASSETS_DIR) / 'logo.png', expand_x=True)],
-        [
-            sg.Text('Файл'),
-            sg.In(size=(45, 1), enable_events=True, key='-FILE-', readonly=True),
-            sg.FileBrowse('Выбрать', key='-SELECT FILE-')
-        ],
-        [sg.Text('Листы для сортировки', expand_x=True, justification='center')],
-
-        [sg.Listbox(
-            values=['1,0', '1,5', '2,5', '4,0', '6,0'],
-            select_mode=sg.LISTBOX_SELECT_MODE_MULTIPLE,
-            size=(40, 6),
-            expand_x=True,
-            key='-WIRE SECTIONS-')],
-        [sg.ProgressBar(100, orientation='h', s=(20, 20), expand_x=True, bar_color=('blue', 'LightSteelBlue3'),
-                        k='-PBAR-')],
-        [sg.Checkbox('сортировать в исходном файле', default=False, key='-IN PLACE-')],
-        [sg.Button('Сортировать', expand_x=True, k='-SORT-'), sg.CloseButton('Выход')],
-    ]
-
-    def __init__(self, app_name, ):
+    # progress bar range occupied by every stage of sorting job
+    STAGES_PROGRESS = {'load': (0, 40), 'sort': (40, 60), 'dump': (60, 90), 'save': (90, 100)}
+    STAGES_NAMES = {'load': 'чтение', 'sort': 'сортировка', 'dump': 'запись', 'save': 'сохранение'}
+
+    @staticmethod
+    def build_layout(wire_sections: Sequence[str], workers: int = 1) -> list:
+        """Elements can't be shared between windows, so layout is built for every window"""
+        return [
+            [sg.Image(filename=Path(ASSETS_DIR) / 'logo.png', expand_x=True)],
+            [
+                sg.Text('Файл'),
+                sg.In(size=(45, 1), enable_events=True, key='-FILE-', readonly=True),
+                sg.FileBrowse('Выбрать', key='-SELECT FILE-')
+            ],
+            [sg.Text('Листы для сортировки', expand_x=True, justification='center')],
+
+            [sg.Listbox(
+                values=list(wire_sections),
+                select_mode=sg.LISTBOX_SELECT_MODE_MULTIPLE,
+                size=(40, 6),
+                expand_x=True,
+                key='-WIRE SECTIONS-')],
+            [sg.ProgressBar(100, orientation='h', s=(20, 20), expand_x=True, bar_color=('blue', 'LightSteelBlue3'),
+                            k='-PBAR-')],
+            [sg.Text('', expand_x=True, justification='center', key='-STATUS-')],
+            [sg.Checkbox('сортировать в исходном файле', default=False, key='-IN PLACE-')],
+            [sg.Checkbox('сортировать только изменённые устройства', default=False, key='-INCREMENTAL-')],
+            [sg.Checkbox('числа по значению: X2 перед X10', default=False, key='-NATURAL-')],
+            [sg.Checkbox('сохранить отчёт о работе рядом с результатом', default=False, key='-REPORT-')],
+            [
+                sg.Text('процессов сортировки'),
+                sg.Spin(
+                    list(range(1, (os.cpu_count() or 1) + 1)), initial_value=workers, readonly=True, key='-WORKERS-'
+                ),
+            ],
+            [
+                sg.Button('Сортировать', expand_x=True, k='-SORT-'),
+                sg.Button('Отмена', disabled=True, k='-CANCEL-'),
+                sg.CloseButton('Выход'),
+            ],
+        ]
+
+    def __init__(self, app_name, wire_sections: Sequence[str], workers: int = 1):
         self.theme = self.THEME
         self.app_name = app_name
-        self.window = sg.Window(self.app_name, self.LAYOUT)
+        self.window = sg.Window(self.app_name, self.build_layout(wire_sections, workers))
+        self._job: Optional[threading.Thread] = None
+        self.snapshot_cache = SnapshotCache(Path(user_cache_dir()) / 'snapshots')
 
     def start(self, backend: Sorter):
         sg.theme(self.theme)
@@ -43,16 +70,16 @@ class GUI:
             event, values = self.window.read()
 
             if event == sg.WIN_CLOSED or event == 'Exit':
+                backend.cancel()
                 break
 
             try:
                 self.handle_event(backend=backend, event=event, values=values)
             except Exception as e:  # FIXME: add exception handling for different use cases
                 sg.popup_error_with_traceback('Ошибка', e.args)
-                self.window['-PBAR-'].update_bar(current_count=0)
-            finally:
-                backend = backend.reset()
-                self.window['-SORT-'].update(disabled=False)
+                self._finish_job()
+            if self._job is None:
+                backend.reset()
 
         self.window.close()
 
@@ -60,22 +87,81 @@ class GUI:
 
         if event == '-SORT-':
             self.window['-SORT-'].update(disabled=True)
-            self.window['-PBAR-'].update_bar(current_count=0)  # FIXME: make progress bar updates dynamic not hardcoded
+            self.window['-CANCEL-'].update(disabled=False)
+            self.window['-PBAR-'].update_bar(current_count=0)
 
             # get user input values
             file = values['-FILE-']
             wire_sections = values['-WIRE SECTIONS-']
             in_place = values['-IN PLACE-']
+            incremental = values['-INCREMENTAL-']
+            report = values['-REPORT-']
+
+            backend.natural_order = values['-NATURAL-']
+            backend.workers = int(values['-WORKERS-'])
+            backend.progress_callback = self._send_progress
+            self._job = threading.Thread(
+                target=self._run_job, args=(backend, file, wire_sections, in_place, incremental, report), daemon=True
+            )
+            self._job.start()
+
+        elif event == '-CANCEL-':
+            backend.cancel()
+
+        elif event == '-PROGRESS-':
+            stage, done, total = values[event]
+            start, end = self.STAGES_PROGRESS[stage]
+            self.window['-PBAR-'].update_bar(current_count=start + (end - start) * done // max(total, 1))
+            self.window['-STATUS-'].update(f'{self.STAGES_NAMES[stage]}: {done} из {total}')
+
+        elif event == '-JOB DONE-':
+            self._finish_job()
+            self.window['-PBAR-'].update_bar(current_count=100)
 
-            # sort markers
-            backend.wb = openpyxl.load_workbook(file)
-            self.window['-PBAR-'].update_bar(current_count=10)
-            backend.add_sheets(wire_sections)
-            backend.sort()
-            self.window['-PBAR-'].update_bar(current_count=25)
+        elif event == '-JOB CANCELLED-':
+            self._finish_job()
+            self.window['-STATUS-'].update('отменено')
+
+        elif event == '-JOB FAILED-':
+            self._finish_job()
+            raise values[event]
+
+    def _finish_job(self) -> None:
+        if self._job is not None:
+            self._job.join()
+            self._job = None
+        self.window['-SORT-'].update(disabled=False)
+        self.window['-CANCEL-'].update(disabled=True)
+        self.window['-PBAR-'].update_bar(current_count=0)
+        self.window['-STATUS-'].update('')
+
+    def _send_progress(self, stage: str, done: int, total: int) -> None:
+        """Called from worker thread, so it only posts event to window"""
+        self.window.write_event_value('-PROGRESS-', (stage, done, total))
+
+    def _run_job(
+            self, backend: Sorter, file: str, wire_sections: List[str], in_place: bool, incremental: bool, report: bool
+    ):
+        """Runs whole sorting pipeline in background thread to keep window responsive"""
+        try:
+            backend.load_file(Path(file), snapshot_cache=self.snapshot_cache)
+            try:
+                backend.add_sheets(wire_sections)
+                if incremental:
+                    backend.enable_incremental(Path(file), in_place=in_place)
+                backend.sort()
+            finally:
+                # source file must be closed before saving in place
+                backend.close()
             backend.dump_circuitry()
-            self.window['-PBAR-'].update_bar(current_count=75)
 
             # save from memory to disc
             backend.save_to_file(Path(file), in_place=in_place)
-            self.window['-PBAR-'].update_bar(current_count=100)
+            if report:
+                backend.write_report(Path(file), in_place=in_place)
+        except SortingCancelledException:
+            self.window.write_event_value('-JOB CANCELLED-', None)
+        except Exception as e:
+            self.window.write_event_value('-JOB FAILED-', e)
+        else:
+            self.window.write_event_value('-JOB DONE-', None)
@@ -0,0 +1,109 @@
+# coding=utf-8
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from entities import Marker, Wire
+from parser import Parser
+from tokenizer import MarkerTokenizer
+
+
+class PresortedDevice:
+    """
+    Sorted device block copied from incremental cache.
+
+    Has the same name and markers as sorted Device, wires are parsed only when somebody asks for them.
+    """
+    __slots__ = ('name', 'section', '_markers', '_wires', '_tokenizer')
+
+    def __init__(self, name: str, markers: List[str], section: str, tokenizer: MarkerTokenizer = Marker.TOKENIZER):
+        self.name = name
+        self.section = section
+        self._markers = markers
+        self._wires: Optional[List[Wire]] = None
+        self._tokenizer = tokenizer
+
+    @property
+    def markers(self) -> List[str]:
+        return self._markers
+
+    @property
+    def markers_count(self) -> int:
+        return len(self._markers)
+
+    @property
+    def wires(self) -> List[Wire]:
+        if self._wires is None:
+            self._wires = Parser._parse_device(self.name, self._markers, self.section, self._tokenizer).wires
+        return self._wires
+
+    def sort(self, natural: bool = False):
+        """Block is already sorted"""
+        return self
+
+    def __repr__(self) -> str:
+        return f'PresortedDevice(name={repr(self.name)}, markers={self._markers})'
+
+
+class IncrementalCache:
+    """
+    Sorted device blocks keyed by content hash of raw device block.
+
+    Cache file is stored next to output file. Blocks are kept per wire section,
+    blocks of sections sorted in the current run replace previous blocks of these sections on save.
+    """
+    VERSION = 1
+    SUFFIX = '.emsort.json'
+
+    def __init__(self, path: Path, mode: str = '', tokenizer: MarkerTokenizer = Marker.TOKENIZER):
+        """
+        :param mode: sort mode description, cached blocks sorted in another mode are ignored.
+        :param tokenizer: grammar of cached markers, wires of presorted devices are parsed with it.
+        """
+        self.path = path
+        self.mode = mode
+        self.tokenizer = tokenizer
+        self._blocks: Dict[str, Dict[str, List[str]]] = {}
+        self._updated: Dict[str, Dict[str, List[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @classmethod
+    def for_output(
+            cls, output_path: Path, mode: str = '', tokenizer: MarkerTokenizer = Marker.TOKENIZER
+    ) -> 'IncrementalCache':
+        return cls(output_path.with_name(f'{output_path.name}{cls.SUFFIX}'), mode=mode, tokenizer=tokenizer)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return
+        if content.get('version') == self.VERSION and content.get('mode') == self.mode:
+            self._blocks = content['sections']
+
+    @staticmethod
+    def digest(device_name: str, markers: List[str]) -> str:
+        raw_block = json.dumps([device_name, markers], ensure_ascii=False)
+        return hashlib.blake2b(raw_block.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, section: str, digest: str, device_name: str) -> Optional[PresortedDevice]:
+        markers = self._blocks.get(section, {}).get(digest)
+        if markers is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._updated.setdefault(section, {})[digest] = markers
+        return PresortedDevice(device_name, markers, section, self.tokenizer)
+
+    def put(self, section: str, digest: str, sorted_markers: List[str]) -> None:
+        self._updated.setdefault(section, {})[digest] = sorted_markers
+
+    def save(self) -> None:
+        sections = {**self._blocks, **self._updated}
+        content = {'version': self.VERSION, 'mode': self.mode, 'sections': sections}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(content, f, ensure_ascii=False)
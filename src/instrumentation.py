@@ -0,0 +1,97 @@
+# coding=utf-8
+import cProfile
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StageRecord:
+    __slots__ = ('stage', 'section', 'seconds', 'items', 'peak_memory')
+
+    def __init__(self, stage: str, section: Optional[str] = None):
+        self.stage = stage
+        self.section = section
+        self.seconds = 0.0
+        # rows, markers or devices processed by stage, stage code fills it
+        self.items = 0
+        self.peak_memory: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.stage,
+            'section': self.section,
+            'seconds': self.seconds,
+            'items': self.items,
+            'items_per_second': self.items / self.seconds if self.seconds else None,
+            'peak_memory_bytes': self.peak_memory,
+        }
+
+
+class Instrumentation:
+    """
+    Records wall time, processed items and optionally allocation peaks of pipeline stages.
+
+    Memory tracing and profiling are opt-in because they slow stages down noticeably.
+    Memory tracing is global to the process, so traced stages must not run concurrently in several threads.
+    """
+
+    def __init__(self, trace_memory: bool = False, profile: bool = False):
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.records: List[StageRecord] = []
+        self._profiler: Optional[cProfile.Profile] = cProfile.Profile() if profile else None
+
+    @contextmanager
+    def stage(self, name: str, section: Optional[str] = None) -> Iterator[StageRecord]:
+        """Stages should not be nested, otherwise memory peaks of outer stage are lost"""
+        record = StageRecord(name, section)
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        if self._profiler is not None:
+            self._profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - started
+            if self._profiler is not None:
+                self._profiler.disable()
+            if self.trace_memory:
+                _, record.peak_memory = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self.records.append(record)
+            logger.info('stage %s%s: %.3fs, %d items', name, f' [{section}]' if section else '', record.seconds,
+                        record.items)
+
+    def totals(self) -> Dict[str, Dict[str, Any]]:
+        totals: Dict[str, Dict[str, Any]] = {}
+        for record in self.records:
+            total = totals.setdefault(record.stage, {'seconds': 0.0, 'items': 0, 'peak_memory_bytes': None})
+            total['seconds'] += record.seconds
+            total['items'] += record.items
+            if record.peak_memory is not None:
+                total['peak_memory_bytes'] = max(total['peak_memory_bytes'] or 0, record.peak_memory)
+        return totals
+
+    def report(self) -> Dict[str, Any]:
+        return {'stages': [record.as_dict() for record in self.records], 'totals': self.totals()}
+
+    def write_report(self, path: Path) -> None:
+        """Writes JSON report, cProfile stats are written next to it with .prof suffix when profiling is on"""
+        report = self.report()
+        if self._profiler is not None:
+            profile_path = path.with_suffix('.prof')
+            self._profiler.dump_stats(str(profile_path))
+            report['profile'] = str(profile_path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
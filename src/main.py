@@ -1,9 +1,12 @@
-from app import App
-
+import logging
+from multiprocessing import freeze_support
 
-# FIXME: add logging
-# FIXME: add settings file
+from app import App
+from settings import load_settings
 
 if __name__ == '__main__':
-    app = App(name='EM Sorter')
+    # required by worker processes in PyInstaller bundle
+    freeze_support()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    app = App(name='EM Sorter', settings=load_settings())
     app.start()
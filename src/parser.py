@@ -1,62 +1,268 @@
-from typing import Dict, List
+import heapq
+import logging
+from itertools import compress, groupby, tee
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 from openpyxl import Workbook
+from openpyxl.utils import column_index_from_string
 
 from entities import Device, Marker, Wire
-from exceptions import UnsupportedMarkerFormatException
+from exceptions import InvalidWorkbookException
+from settings import DEFAULT_SETTINGS, Settings
+from tokenizer import MarkerTokenizer
 from utils import pairwise
 
+logger = logging.getLogger(__name__)
+
+
+def is_sheet_value(value: Any) -> bool:
+    """Only non-blank strings are device headers and markers, empty cells, numbers and dates are skipped"""
+    return value.__class__ is str and value != '' and not value.isspace()
+
+
+class DeviceBlock(NamedTuple):
+    """Device header with its markers, position is (row, column) of the header cell"""
+    position: Tuple[int, int]
+    name: str
+    markers: List[str]
+    # row of every marker, collected only on request
+    marker_rows: Optional[List[int]] = None
 
-class Parser:
-    INPUT_DATA_COLUMN = 'A'
-    SUPPORTED_WIRE_SECTIONS = ('1,0', '1,5', '2,5', '4,0', '6,0')
 
-    def __init__(self, workbook: Workbook, schematic: Dict[str, List[Device]]):
+class Parser:
+    def __init__(self, workbook: Workbook, schematic: Dict[str, List[Device]], settings: Settings = DEFAULT_SETTINGS):
+        """:param settings: marker grammar, supported wire sections and input column"""
         self.parsed_schematic = schematic
         self.raw_schematic = {}
         self.workbook = workbook
+        self.settings = settings
 
-    def _load_sheet_contents(self, sheet_title: str, column: str = INPUT_DATA_COLUMN) -> None:
-        raw_devices = {}
+    def _iter_sheet_values(self, sheet_title: str, column: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields cell values of one column row by row.
+
+        Works with read-only workbooks too, so rows are decoded lazily and never kept in memory as cells.
+        Blank and non-string cells are skipped.
+        """
+        column_index = column_index_from_string(column or self.settings.input_column)
+        rows = self.workbook[sheet_title].iter_rows(min_col=column_index, max_col=column_index, values_only=True)
+        for (value,) in rows:
+            if value is not None and is_sheet_value(value):
+                yield value
+
+    def _is_single_column(self, sheet_title: str) -> bool:
+        """Sheet has no cells to the right of input column, unknown dimensions of read-only sheet count as many"""
+        max_column = getattr(self.workbook[sheet_title], 'max_column', None)
+        return max_column is not None and max_column <= column_index_from_string(self.settings.input_column)
+
+    @staticmethod
+    def _iter_device_blocks(
+            rows: Iterable[tuple], min_col: int = 1, track_rows: bool = False
+    ) -> Iterator[DeviceBlock]:
+        """
+        Scans used range row by row once and yields device blocks of all columns.
+
+        Every column is a separate sequence of blocks: device header followed by markers down to the next
+        header in the same column. Blocks may stand side by side and be separated by blank rows.
+        Open blocks index header positions, blocks are yielded in order of header positions,
+        by row and then by column, as soon as the block and all blocks started before it are complete,
+        so blocks of a single-column sheet are never held in memory together. Blocks completed while a block
+        side by side started before them is still open are held, so bounded memory streaming uses
+        iter_device_streams instead. With track_rows flag row of every marker is collected too.
+        """
+        open_blocks: Dict[int, DeviceBlock] = {}
+        complete: List[DeviceBlock] = []
+
+        # used range of exported sheets often spans the whole sheet, empty rows are dropped without python loop
+        rows, filled = tee(rows)
+        for row_index, row in compress(enumerate(rows, start=1), map(any, filled)):
+            for column_index, value in enumerate(row, start=min_col):
+                if not is_sheet_value(value):
+                    continue
+                if 'Device' in value:
+                    block = open_blocks.get(column_index)
+                    if block is not None:
+                        heapq.heappush(complete, block)
+                    open_blocks[column_index] = DeviceBlock(
+                        (row_index, column_index), value, [], [] if track_rows else None
+                    )
+                    continue
+                block = open_blocks.get(column_index)
+                # values above the first header of column do not belong to any device
+                if block is not None:
+                    block.markers.append(value)
+                    if track_rows:
+                        block.marker_rows.append(row_index)
+            if complete:
+                first_open = min(block.position for block in open_blocks.values())
+                while complete and complete[0].position < first_open:
+                    yield heapq.heappop(complete)
+
+        for block in open_blocks.values():
+            heapq.heappush(complete, block)
+        while complete:
+            yield heapq.heappop(complete)
+
+    def iter_sheet_blocks(self, sheet_title: str, track_rows: bool = False) -> Iterator[DeviceBlock]:
+        """Device blocks of sheet starting from input column, see _iter_device_blocks"""
+        min_col = column_index_from_string(self.settings.input_column)
+        rows = self.workbook[sheet_title].iter_rows(min_col=min_col, values_only=True)
+        return self._iter_device_blocks(rows, min_col, track_rows)
+
+    def _iter_sheet_device_groups(self, sheet_title: str) -> Iterator[Tuple[str, List[str]]]:
+        """Device groups of all blocks of sheet starting from input column"""
+        for block in self.iter_sheet_blocks(sheet_title):
+            yield block.name, block.markers
+
+    def iter_device_streams(self, sheet_title: str) -> Iterator[Tuple[str, Iterator[str]]]:
+        """
+        Device streams of sheet, see _iter_device_streams.
+
+        Markers of single-column sheets are streamed in one pass, see _iter_column_streams for other layouts.
+        """
+        if self._is_single_column(sheet_title):
+            return self._iter_device_streams(self._iter_sheet_values(sheet_title))
+        return self._iter_column_streams(sheet_title)
+
+    def _iter_column_streams(self, sheet_title: str) -> Iterator[Tuple[str, Iterator[str]]]:
+        """
+        Device streams of sheet with any layout in the same order as iter_sheet_blocks.
+
+        Header positions are found in the first pass, then every column with headers is read by its own lazy
+        row iterator, so markers of side-by-side blocks are streamed too and cells of columns without headers
+        are never collected. Markers stream of device must be consumed before moving to the next device.
+        """
+        min_col = column_index_from_string(self.settings.input_column)
+        rows, filled = tee(self.workbook[sheet_title].iter_rows(min_col=min_col, values_only=True))
+        headers: List[Tuple[int, int, str]] = [
+            (row_index, column_index, value)
+            for row_index, row in compress(enumerate(rows, start=1), map(any, filled))
+            for column_index, value in enumerate(row, start=min_col)
+            if is_sheet_value(value) and 'Device' in value
+        ]
+
+        # row of the next header in the same column, where the block ends
+        block_ends: List[Optional[int]] = []
+        next_headers: Dict[int, int] = {}
+        for row_index, column_index, _ in reversed(headers):
+            block_ends.append(next_headers.get(column_index))
+            next_headers[column_index] = row_index
+        block_ends.reverse()
+
+        def block_markers(cells: Iterator[Tuple[int, tuple]], start: int, end: Optional[int]) -> Iterator[str]:
+            for row_index, (value,) in cells:
+                if end is not None and row_index >= end:
+                    return
+                if row_index > start and is_sheet_value(value):
+                    yield value
+
+        columns: Dict[int, Iterator[Tuple[int, tuple]]] = {}
+        for (row_index, column_index, device_name), end in zip(headers, block_ends):
+            cells = columns.get(column_index)
+            if cells is None:
+                rows = self.workbook[sheet_title].iter_rows(
+                    min_col=column_index, max_col=column_index, values_only=True
+                )
+                cells = columns[column_index] = enumerate(rows, start=1)
+            yield device_name, block_markers(cells, row_index, end)
+
+    @staticmethod
+    def _iter_device_groups(values: Iterable[str]) -> Iterator[Tuple[str, List[str]]]:
+        """ 'Device A1', m1, m2, 'Device A2', m3, m4 -> ('Device A1', [m1, m2]), ('Device A2', [m3, m4]) """
         current_device = None
+        markers: List[str] = []
+
+        for value in values:
+            if 'Device' in value:
+                if current_device is not None:
+                    yield current_device, markers
+                current_device = value
+                markers = []
+                continue
+            markers.append(value)
+
+        if current_device is not None:
+            yield current_device, markers
+
+    @staticmethod
+    def _iter_device_streams(values: Iterable[str]) -> Iterator[Tuple[str, Iterator[str]]]:
+        """
+        Same as _iter_device_groups but markers of device are not collected into list.
 
-        for cell in self.workbook[sheet_title][column]:
-            if 'Device' in cell.value:
-                current_device = cell.value
-                raw_devices[current_device] = []
+        Markers stream of device must be consumed before moving to the next device.
+        """
+        headers_quantity = 0
+
+        def device_number(value: str) -> int:
+            nonlocal headers_quantity
+            if 'Device' in value:
+                headers_quantity += 1
+            return headers_quantity
+
+        for number, group in groupby(values, key=device_number):
+            # values before the first device header do not belong to any device
+            if number == 0:
                 continue
-            raw_devices[current_device].append(cell.value)
+            yield next(group), group
 
+    def _load_sheet_contents(self, sheet_title: str, column: Optional[str] = None) -> None:
+        """Loads device groups of one column or of all blocks of sheet when column is not given"""
+        if column is None:
+            device_groups = self._iter_sheet_device_groups(sheet_title)
+        else:
+            device_groups = self._iter_device_groups(self._iter_sheet_values(sheet_title, column))
+        raw_devices = {}
+        for device_name, markers in device_groups:
+            raw_devices[device_name] = markers
         self.raw_schematic[sheet_title] = raw_devices
 
-    def _parse_devices(self, devices: Dict[str, List[str]], wire_section: str) -> List[Device]:
-        parsed_devices = []
+    @staticmethod
+    def _parse_device(
+            device_name: str, markers: List[str], wire_section: str, tokenizer: MarkerTokenizer = Marker.TOKENIZER
+    ) -> Device:
+        if len(markers) % 2:
+            raise InvalidWorkbookException(
+                f'{device_name} on sheet {wire_section!r} has odd quantity of markers: {len(markers)}.'
+            )
+        d = Device(name=device_name)
+        markers_tokens = tokenizer.tokenize_many(markers)
 
-        for device_name, markers in devices.items():
-            # ensure that device has valid markers quantity
-            assert len(markers) % 2 == 0
-            d = Device(name=device_name)
+        wires = []
+        for (label_from, label_to), (tokens_from, tokens_to) in zip(pairwise(markers), pairwise(markers_tokens)):
+            marker_from = Marker(label_from, tokenizer).apply_tokens(tokens_from)
+            marker_to = Marker(label_to, tokenizer).apply_tokens(tokens_to)
 
-            for marker_from, marker_to in pairwise(markers):
-                marker_from, marker_to = Marker(marker_from), Marker(marker_to)
+            for marker in (marker_from, marker_to):
+                if marker.unsupported_format:
+                    logger.warning('Unsupported format for marker: %r', marker.label)
 
-                for marker in (marker_from, marker_to):
-                    try:
-                        marker.parse()
-                    except UnsupportedMarkerFormatException:
-                        print(f'Unsupported format for marker: {repr(marker.label)}')  # FIXME: add logging
+            wires.append(Wire(frm=marker_from, to=marker_to, section=wire_section))
 
-                wire = Wire(frm=marker_from, to=marker_to, section=wire_section)
-                d.add_wires([wire])
+        d.add_wires(wires)
+        return d
 
-            parsed_devices.append(d)
-        return parsed_devices
+    def _parse_devices(self, devices: Dict[str, List[str]], wire_section: str) -> List[Device]:
+        tokenizer = self.settings.tokenizer
+        return [self._parse_device(name, markers, wire_section, tokenizer) for name, markers in devices.items()]
 
-    def parse(self) -> None:
+    def iter_raw_sections(self) -> Iterator[Tuple[str, Iterator[Tuple[str, List[str]]]]]:
+        """Yields supported wire sections in workbook order with lazily loaded device groups of each section"""
         for sheet in self.workbook.worksheets:
             wire_section: str = sheet.title
-            if wire_section not in Parser.SUPPORTED_WIRE_SECTIONS:
+            if wire_section not in self.settings.wire_sections:
                 continue
-            self._load_sheet_contents(wire_section)
-            parsed_devices = self._parse_devices(self.raw_schematic[wire_section], wire_section)
-            self.parsed_schematic[wire_section] = parsed_devices
+            yield wire_section, self._iter_sheet_device_groups(wire_section)
+
+    def parse(self) -> None:
+        """
+        Parses all supported sheets.
+
+        Device groups are fed to the parser one at a time straight from the sheet rows,
+        so with a read-only workbook raw sheet contents are never held in memory as a whole.
+        """
+        tokenizer = self.settings.tokenizer
+        for wire_section, device_groups in self.iter_raw_sections():
+            self.parsed_schematic[wire_section] = [
+                self._parse_device(device_name, markers, wire_section, tokenizer)
+                for device_name, markers in device_groups
+            ]
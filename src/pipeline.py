@@ -0,0 +1,192 @@
+# coding=utf-8
+"""
+Asynchronous batch pipeline.
+
+Files go through three stages connected with bounded queues: load, process (parse, sort and dump) and save.
+Stages run in worker threads of one process, so while one file is sorted the next one is read from disk.
+Only waiting for disk overlaps: load stage just reads file bytes into memory, while parsing, sorting, dumping
+and saving are Python code which holds the GIL and runs one stage at a time. The pipeline saves the time of
+reading files, batches of CPU-bound files are faster with several processes, see cli --jobs.
+"""
+import asyncio
+import logging
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple, Optional, Sequence
+
+from exceptions import IncompatibleOptionsException, InvalidOptionException, InvalidWorkbookException
+from settings import DEFAULT_SETTINGS, Settings
+from snapshot import SnapshotCache
+from sorter import Sorter
+
+logger = logging.getLogger(__name__)
+
+MERGED_VIEWS = ('devices', 'consolidated')
+
+
+class FileResult(NamedTuple):
+    path: Path
+    elapsed: float
+    error: Optional[str] = None
+
+
+class SortJob:
+    """
+    Sorting of one workbook split into load, process and save stages.
+
+    Sections missing in workbook are skipped, None means all sections.
+    With report flag run report is written next to the output file.
+    With snapshot cache unchanged workbooks are not decoded and parsed again.
+    With max_wires_in_memory devices are sorted externally with bounded memory.
+    CSV and columnar sources are read with table backends, output is written in output_format.
+    With cross_check flag all sections are parsed and wire conflicts are written next to the output file.
+    Merged view of devices across sorted sections is added to the output as one sheet per device
+    with merged='devices' or as one sheet with merged='consolidated', merged devices are held in memory whole
+    even with max_wires_in_memory.
+    With validate report format selected sections are validated before sorting, all found problems are written
+    next to the output file and workbook with problems which make sorting fail is not sorted.
+    Source files are read with marker grammar and wire sections of settings.
+    With workers other than 1 devices of one workbook are sorted in a process pool of that size.
+    """
+
+    def __init__(
+            self,
+            path: Path,
+            sections: Optional[Sequence[str]] = None,
+            in_place: bool = False,
+            natural_order: bool = False,
+            incremental: bool = False,
+            report: bool = False,
+            trace_memory: bool = False,
+            profile: bool = False,
+            snapshot_cache: Optional[SnapshotCache] = None,
+            max_wires_in_memory: Optional[int] = None,
+            output_format: str = 'xlsx',
+            cross_check: bool = False,
+            merged: Optional[str] = None,
+            validate: Optional[str] = None,
+            settings: Settings = DEFAULT_SETTINGS,
+            workers: Optional[int] = 1,
+    ):
+        self.path = path
+        self.sections = sections
+        self.in_place = in_place
+        self.incremental = incremental
+        self.report = report
+        self.snapshot_cache = snapshot_cache
+        self.cross_check = cross_check
+        self.merged = merged
+        self.validate = validate
+        self.sorter = Sorter(
+            write_only=True,
+            workers=workers,
+            natural_order=natural_order,
+            trace_memory=trace_memory,
+            profile=profile,
+            lazy_sections=not cross_check,
+            max_wires_in_memory=max_wires_in_memory,
+            output_format=output_format,
+            settings=settings,
+        )
+        self.elapsed = 0.0
+        self.error: Optional[str] = None
+
+    def load(self, preload: bool = False) -> None:
+        with self.sorter.instrumentation.stage('load'):
+            self.sorter.load_file(self.path, snapshot_cache=self.snapshot_cache, preload=preload)
+
+    def process(self) -> None:
+        sorter = self.sorter
+        try:
+            supported_sections = [name for name in sorter.sheetnames if name in sorter.settings.wire_sections]
+            sorter.add_sheets([name for name in supported_sections if self.sections is None or name in self.sections])
+            if self.validate is not None:
+                self._validate()
+            if self.incremental:
+                sorter.enable_incremental(self.path, in_place=self.in_place)
+            sorter.sort()
+            if self.cross_check:
+                conflicts = sorter.find_conflicts()
+                sorter.write_conflicts(conflicts, self.path, in_place=self.in_place)
+                if conflicts:
+                    logger.warning('%s: %d wire conflicts found', self.path, len(conflicts))
+        finally:
+            # source file must be closed before saving in place
+            sorter.close()
+        sorter.dump_circuitry()
+        if self.merged is not None:
+            sorter.dump_merged_devices(consolidated=self.merged == 'consolidated')
+
+    def _validate(self) -> None:
+        problems = self.sorter.validate()
+        if not problems:
+            return
+        problems_path = self.sorter.write_problems(
+            problems, self.path, in_place=self.in_place, report_format=self.validate
+        )
+        blocking = sum(problem.is_blocking for problem in problems)
+        if blocking:
+            raise InvalidWorkbookException(f'{blocking} of {len(problems)} problems stop sorting, see {problems_path}')
+        logger.warning('%s: %d problems found, see %s', self.path, len(problems), problems_path)
+
+    def save(self) -> None:
+        self.sorter.save_to_file(self.path, in_place=self.in_place)
+        if self.report:
+            self.sorter.write_report(self.path, in_place=self.in_place)
+
+    def run_stage(self, stage: Callable[[], None]) -> None:
+        """Runs stage unless previous stage failed, failure is stored and does not stop the batch"""
+        if self.error is not None:
+            return
+        started = time.perf_counter()
+        try:
+            stage()
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+            self.sorter.close()
+        finally:
+            self.elapsed += time.perf_counter() - started
+
+    def result(self) -> FileResult:
+        return FileResult(self.path, self.elapsed, self.error)
+
+
+async def run_pipeline(paths: Iterable[Path], options: dict, queue_size: int = 1) -> List[FileResult]:
+    """
+    Sorts files with load, process and save stages running concurrently.
+
+    :param options: keyword arguments of SortJob.
+    :param queue_size: number of files waiting between two stages, bounds memory taken by loaded files.
+    Results are returned in order of paths, elapsed time of file is the sum of its stages.
+    Memory tracing is global to the process and stages of different files overlap, so trace_memory is rejected.
+    """
+    if queue_size < 1:
+        # queue of size 0 is unbounded
+        raise InvalidOptionException(f'Queue size must be at least 1, got {queue_size}.')
+    if options.get('trace_memory'):
+        raise IncompatibleOptionsException('Memory tracing can not be used in pipeline, stages run concurrently.')
+    load_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    save_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    results: List[FileResult] = []
+
+    async def load() -> None:
+        for path in paths:
+            job = SortJob(path, **options)
+            await asyncio.to_thread(job.run_stage, partial(job.load, preload=True))
+            await load_queue.put(job)
+        await load_queue.put(None)
+
+    async def process() -> None:
+        while (job := await load_queue.get()) is not None:
+            await asyncio.to_thread(job.run_stage, job.process)
+            await save_queue.put(job)
+        await save_queue.put(None)
+
+    async def save() -> None:
+        while (job := await save_queue.get()) is not None:
+            await asyncio.to_thread(job.run_stage, job.save)
+            results.append(job.result())
+
+    await asyncio.gather(load(), process(), save())
+    return results
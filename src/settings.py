@@ -0,0 +1,96 @@
+# coding=utf-8
+"""
+Settings of marker grammar and wire sections.
+
+Settings are read from JSON file, missing keys keep default values, e.g.:
+    {"wire_sep": " ", "address_sep": ":", "jack_sep": "-", "wire_sections": ["1,0", "1,5"], "input_column": "A"}
+Settings are passed to Parser and Sorter, nothing is installed process-wide. Tokenizers of marker grammar
+are cached by grammar, so switching between configurations does not create them again.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+from openpyxl.utils import column_index_from_string
+
+from exceptions import InvalidSettingsException
+from tokenizer import MarkerTokenizer
+from utils import user_config_dir
+
+SETTINGS_FILE_NAME = 'settings.json'
+
+
+class Settings(NamedTuple):
+    wire_sep: str = ' '
+    address_sep: str = ':'
+    jack_sep: str = '-'
+    wire_sections: Tuple[str, ...] = ('1,0', '1,5', '2,5', '4,0', '6,0')
+    input_column: str = 'A'
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Settings':
+        unknown_keys = set(data) - set(cls._fields)
+        if unknown_keys:
+            raise InvalidSettingsException(f'Unknown settings: {", ".join(sorted(unknown_keys))}.')
+        if 'wire_sections' in data:
+            if not isinstance(data['wire_sections'], (list, tuple)):
+                raise InvalidSettingsException('Wire sections must be a non-empty list of sheet names.')
+            data = {**data, 'wire_sections': tuple(data['wire_sections'])}
+        settings = cls(**data)
+        settings.validate()
+        return settings
+
+    def validate(self) -> None:
+        separators = (self.wire_sep, self.address_sep, self.jack_sep)
+        if not all(isinstance(sep, str) and len(sep) == 1 for sep in separators):
+            raise InvalidSettingsException('Separators must be single characters.')
+        if len(set(separators)) != len(separators):
+            raise InvalidSettingsException('Separators must differ from each other.')
+        if not isinstance(self.wire_sections, (list, tuple)) or not self.wire_sections or not all(
+                isinstance(section, str) and section.strip() for section in self.wire_sections
+        ):
+            raise InvalidSettingsException('Wire sections must be a non-empty list of sheet names.')
+        try:
+            column_index_from_string(self.input_column)
+        except (ValueError, AttributeError) as e:
+            raise InvalidSettingsException(f'Invalid input column: {self.input_column!r}.') from e
+
+    @property
+    def tokenizer(self) -> MarkerTokenizer:
+        return get_tokenizer(self.wire_sep, self.address_sep, self.jack_sep)
+
+    @property
+    def digest(self) -> str:
+        """Short digest of settings, it tells apart caches made with different settings"""
+        return hashlib.blake2b(json.dumps(self._asdict()).encode('utf-8'), digest_size=4).hexdigest()
+
+
+DEFAULT_SETTINGS = Settings()
+
+
+def default_settings_path() -> Path:
+    return Path(os.getenv('EM_SORT_SETTINGS') or Path(user_config_dir()) / SETTINGS_FILE_NAME)
+
+
+def load_settings(path: Optional[Path] = None) -> Settings:
+    """Reads settings file, default file may be absent and then default settings are used"""
+    if path is None:
+        path = default_settings_path()
+        if not path.exists():
+            return DEFAULT_SETTINGS
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise InvalidSettingsException(f'Settings file {path} is not valid JSON: {e}') from e
+    if not isinstance(data, dict):
+        raise InvalidSettingsException(f'Settings file {path} must contain JSON object.')
+    return Settings.from_dict(data)
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(wire_sep: str, address_sep: str, jack_sep: str) -> MarkerTokenizer:
+    return MarkerTokenizer(wire_sep, address_sep, jack_sep)
@@ -0,0 +1,94 @@
+# coding=utf-8
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from entities import Device
+
+
+class Snapshot:
+    """Parsed but not sorted sections of source workbook"""
+    __slots__ = ('sheetnames', 'sections')
+
+    def __init__(self, sheetnames: List[str], sections: Dict[str, List[Device]]):
+        self.sheetnames = sheetnames
+        self.sections = sections
+
+
+class SnapshotCache:
+    """
+    Persistent cache of parsed workbooks.
+
+    Snapshots are keyed by size, modification time and content hash of source file and stored as pickles.
+    Least recently used snapshots are evicted when total size of cache exceeds max_bytes.
+    Cache directory may be shared by several processes, snapshots removed by another process are skipped.
+    """
+    VERSION = 1
+    SUFFIX = '.snapshot'
+    HASH_BLOCK_SIZE = 2 ** 20
+
+    def __init__(self, directory: Path, max_bytes: int = 2 ** 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def fingerprint(cls, source_path: Path) -> str:
+        stat = source_path.stat()
+        content_hash = hashlib.blake2b(digest_size=16)
+        with open(source_path, 'rb') as f:
+            for block in iter(lambda: f.read(cls.HASH_BLOCK_SIZE), b''):
+                content_hash.update(block)
+        return f'{stat.st_size}-{stat.st_mtime_ns}-{content_hash.hexdigest()}'
+
+    def _snapshot_path(self, fingerprint: str) -> Path:
+        return self.directory / f'{fingerprint}{self.SUFFIX}'
+
+    def load(self, fingerprint: str) -> Optional[Snapshot]:
+        path = self._snapshot_path(fingerprint)
+        try:
+            with open(path, 'rb') as f:
+                version, snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError):
+            return None
+        if version != self.VERSION:
+            return None
+        # modification time of snapshot is used as its last access time for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def store(self, fingerprint: str, snapshot: Snapshot) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._snapshot_path(fingerprint)
+        # unique temporary file, processes storing the same snapshot at once do not write into one file
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=path.name, suffix='.tmp', delete=False) as f:
+            try:
+                pickle.dump((self.VERSION, snapshot), f, protocol=pickle.HIGHEST_PROTOCOL)
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+        self.evict()
+
+    def evict(self) -> None:
+        snapshots = []
+        for path in self.directory.glob(f'*{self.SUFFIX}'):
+            try:
+                snapshots.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        total = sum(stat.st_size for stat, _ in snapshots)
+        for stat, path in sorted(snapshots, key=lambda item: item[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
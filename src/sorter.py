@@ -1,83 +1,809 @@
 # coding=utf-8
 from __future__ import annotations
 
+import copy
+import json
+import re
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, List
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, List, Set, Tuple, Union
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill
 from openpyxl.worksheet.worksheet import Worksheet
 
+from backends import FORMAT_SUFFIXES, TableSheet, TableWorkbook, create_output_workbook, file_format, load_workbook
+from crossref import Conflict, find_conflicts
 from entities import Device, Schematic
-from exceptions import UnsupportedTypeException, SheetDoesNotExistsException
+from external import RunFile, sort_device_external
+from exceptions import (
+    UnsupportedTypeException,
+    SheetDoesNotExistsException,
+    SortingCancelledException,
+    IncompatibleOptionsException,
+    InvalidOptionException,
+    UnsupportedFileFormatException,
+)
+from incremental import IncrementalCache, PresortedDevice
+from instrumentation import Instrumentation
 from parser import Parser
+from settings import DEFAULT_SETTINGS, Settings
+from snapshot import Snapshot, SnapshotCache
+from validation import Problem, validate_sheets, write_problems_json, write_problems_sheet
+
+# receives stage name ('load', 'sort', 'dump' or 'save'), processed and total quantity of stage items
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def sort_devices(devices: List[Device], natural: bool = False) -> None:
+    """Sorts wires of every device, natural flag enables numeric-aware ordering: 'X2' < 'X10'"""
+    for device in devices:
+        device.sort(natural=natural)
+
+
+def _sort_chunk(
+        device_groups: List[Tuple[str, List[str]]],
+        wire_section: str,
+        natural: bool,
+        settings: Settings = DEFAULT_SETTINGS,
+) -> List[List[str]]:
+    """
+    Process pool task: parses and sorts chunk of raw device groups, returns sorted markers of every device.
+
+    Only labels are sent back, unpickling parsed wires in the main process costs more than parsing them.
+    """
+    tokenizer = settings.tokenizer
+    devices = [Parser._parse_device(name, markers, wire_section, tokenizer) for name, markers in device_groups]
+    sort_devices(devices, natural)
+    return [device.markers for device in devices]
 
 
 class Sorter:
-    # FIXME: make loading these constants from settings
-    INPUT_DATA_COLUMN = 'A'
+    DEVICE_HEADER_FILL = PatternFill(fill_type='solid', start_color='00C0C0C0', end_color='00C0C0C0')
+    # approximate quantity of markers sent to one worker process at once, device is never split between chunks
+    PARALLEL_CHUNK_SIZE = 20000
+    # rows or devices processed between two progress reports
+    PROGRESS_STEP = 1000
+    MERGED_SHEET_TITLE = 'Merged'
+    MAX_SHEET_TITLE_LENGTH = 31
+    INVALID_TITLE_CHARACTERS = re.compile(r'[\\/*?:\[\]]')
+    SORTED_STEM_SUFFIX = '_sorted'
+    # files written next to the output file, their names are output file name followed by suffix
+    REPORT_SUFFIX = '.report.json'
+    PROFILE_SUFFIX = '.report.prof'
+    CONFLICTS_SUFFIX = '.conflicts.json'
+    PROBLEMS_SUFFIXES = {'json': '.problems.json', 'sheet': '.problems.xlsx'}
+    SIDE_FILE_SUFFIXES = (
+        REPORT_SUFFIX, PROFILE_SUFFIX, CONFLICTS_SUFFIX, *PROBLEMS_SUFFIXES.values(), IncrementalCache.SUFFIX
+    )
 
-    def __init__(self, workbook: Optional[Workbook] = None):
+    def __init__(
+            self,
+            workbook: Optional[Workbook] = None,
+            write_only: bool = False,
+            workers: Optional[int] = 1,
+            natural_order: bool = False,
+            trace_memory: bool = False,
+            profile: bool = False,
+            lazy_sections: bool = False,
+            max_wires_in_memory: Optional[int] = None,
+            output_format: str = 'xlsx',
+            keep_warm: bool = False,
+            settings: Settings = DEFAULT_SETTINGS,
+    ):
+        """
+        :param write_only: stream output rows to disk instead of building output workbook in memory.
+            Dumped sheets can't be read back and output can be saved only once in this mode.
+        :param workers: number of worker processes used for sorting, None means number of CPUs.
+            Workers send back only sorted markers, devices sorted in the pool are PresortedDevice objects.
+        :param natural_order: compare names and contacts numeric-aware, so 'X2' goes before 'X10'.
+        :param trace_memory: record allocation peaks of every stage with tracemalloc.
+        :param profile: run stages under cProfile.
+        :param lazy_sections: parse only selected sections, other sections are passed to the output as raw values
+            and are absent in schematic. Snapshot and session modes keep all sections parsed, so the flag
+            has no effect together with snapshot cache or keep_warm, it is meant for one-shot command line runs.
+        :param max_wires_in_memory: external sort mode, selected sections are sorted by chunks of this many wires
+            spilled to temporary files and merged while dumping. Parsed workbook snapshot is not stored in this mode.
+            Sorting is serial and without incremental cache, so workers other than 1 and enable_incremental
+            are rejected in this mode.
+        :param output_format: one of backends.OUTPUT_FORMATS, format of output file.
+        :param keep_warm: session mode, parsed sections of loaded file and sorted sections are kept by reset,
+            so sorting other sections of the same unchanged file neither reads nor parses it again.
+            All sections are parsed in this mode.
+        :param settings: marker grammar, supported wire sections and input column of source files.
+        """
+        if max_wires_in_memory is not None and max_wires_in_memory < 1:
+            raise InvalidOptionException(f'max_wires_in_memory must be at least 1, got {max_wires_in_memory}.')
+        self._max_wires_in_memory = max_wires_in_memory
+        self.workers = workers
         self._input_wb = workbook
-        self._output_wb = Workbook()
+        self._write_only = write_only
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._natural_order = natural_order
+        self._spill_directory: Optional[tempfile.TemporaryDirectory] = None
+        self._run_files: List[RunFile] = []
+        self.progress_callback: Optional[ProgressCallback] = None
+        self._output_format = output_format
+        self._lazy_sections = lazy_sections
+        self._keep_warm = keep_warm
+        self._settings = settings
+        # parsed not sorted sections of loaded file, fingerprint of the file and its sorted sections
+        self._warm: Optional[Snapshot] = None
+        self._warm_fingerprint: Optional[str] = None
+        self._warm_sorted: Dict[str, List[Device]] = {}
+        self._init_run(trace_memory=trace_memory, profile=profile)
+
+    def _init_run(self, trace_memory: bool, profile: bool) -> None:
+        """Creates state of one sorting run: output workbook, schematic, selected sections"""
+        self._cancelled = False
+        self._incremental_cache: Optional[IncrementalCache] = None
+        self._snapshot: Optional[Snapshot] = None
+        self._snapshot_target: Optional[Tuple[SnapshotCache, str]] = None
+        self._source_path: Optional[Path] = None
+        self.instrumentation = Instrumentation(trace_memory=trace_memory, profile=profile)
+        self._output_wb = create_output_workbook(self._output_format, write_only=self._write_only)
+        # lowercase titles of created output sheets, Excel compares titles case-insensitively
+        self._sheet_titles: Set[str] = set()
 
         self.schematic = Schematic()
-        self.parser = Parser(workbook, self.schematic.content)
+        self.parser = Parser(self._input_wb, self.schematic.content, self._settings)
         self._sheets_for_sort: List[str] = []
+        # raw values of not parsed sections
+        self._passthrough: Dict[str, List[Any]] = {}
+
+    def load_file(self, path: Path, snapshot_cache: Optional[SnapshotCache] = None, preload: bool = False) -> None:
+        """
+        Opens source file read-only, CSV and columnar files are read with table backends.
+
+        With snapshot cache unchanged file is not decoded and parsed at all, parsed sections are taken from cache.
+        With preload flag XLSX file is read into memory at once instead of being read lazily while parsing.
+        In session mode unchanged file which was loaded before is not read again.
+        """
+        self._source_path = path
+        if self._keep_warm or snapshot_cache is not None:
+            # parsed sections depend on marker grammar as much as on file contents
+            fingerprint = f'{SnapshotCache.fingerprint(path)}-{self._settings.digest}'
+        if self._keep_warm:
+            if self._warm is not None and fingerprint == self._warm_fingerprint:
+                self._snapshot = self._warm
+                return
+            self._warm, self._warm_fingerprint, self._warm_sorted = None, fingerprint, {}
+        if snapshot_cache is not None:
+            self._snapshot = snapshot_cache.load(fingerprint)
+            if self._snapshot is not None:
+                return
+            self._snapshot_target = snapshot_cache, fingerprint
+        self.wb = load_workbook(path, preload=preload)
 
-        # remove created by default sheet
-        self._output_wb.remove(self._output_wb.active)
+    def close(self) -> None:
+        """Closes source workbook, read-only workbook keeps source file open until closed"""
+        if self._input_wb is not None:
+            self._input_wb.close()
+
+    @property
+    def sheetnames(self) -> List[str]:
+        if self._snapshot is not None:
+            return self._snapshot.sheetnames
+        if self.wb is None:
+            return []
+        return self.wb.sheetnames
 
     def add_sheets(self, sheets_names: List[str]) -> None:
         for name in sheets_names:
-            try:
-                self.wb[name]
-            except KeyError:
+            if name not in self.sheetnames:
                 raise SheetDoesNotExistsException(f'Worksheet {name} does not exist.')
             if name not in self._sheets_for_sort:
                 self._sheets_for_sort.append(name)
 
     @property
-    def wb(self) -> Optional[Workbook]:
+    def settings(self) -> Settings:
+        return self._settings
+
+    @property
+    def natural_order(self) -> bool:
+        return self._natural_order
+
+    @natural_order.setter
+    def natural_order(self, natural_order: bool) -> None:
+        """Sorted sections kept in session mode were sorted in the other order, so they are dropped"""
+        if natural_order != self._natural_order:
+            self._natural_order = natural_order
+            self._warm_sorted = {}
+
+    @property
+    def workers(self) -> Optional[int]:
+        return self._workers
+
+    @workers.setter
+    def workers(self, workers: Optional[int]) -> None:
+        if workers != 1 and self._max_wires_in_memory is not None:
+            raise IncompatibleOptionsException('Workers can not be used with max_wires_in_memory.')
+        self._workers = workers
+
+    @property
+    def wb(self) -> Optional[Union[Workbook, TableWorkbook]]:
         return self._input_wb
 
     @wb.setter
-    def wb(self, workbook: Workbook) -> None:
-        if isinstance(workbook, Workbook):
+    def wb(self, workbook: Union[Workbook, TableWorkbook]) -> None:
+        if isinstance(workbook, (Workbook, TableWorkbook)):
             self._input_wb = workbook
             self.parser.workbook = workbook
         else:
             raise UnsupportedTypeException
 
+    def enable_incremental(self, target_file_path: Path, in_place=False) -> None:
+        """
+        Sort only devices changed since the previous run with the same output file.
+
+        Sorted blocks of unchanged devices are copied from cache file stored next to the output file.
+        """
+        if self._max_wires_in_memory is not None:
+            raise IncompatibleOptionsException('Incremental sort can not be used with max_wires_in_memory.')
+        mode = f"{'natural' if self._natural_order else 'plain'}-{self._settings.digest}"
+        output_path = self.output_path(target_file_path, in_place, self._output_format)
+        self._incremental_cache = IncrementalCache.for_output(
+            output_path, mode=mode, tokenizer=self._settings.tokenizer
+        )
+
+    def cancel(self) -> None:
+        """Stops running job at the next progress report, can be called from another thread"""
+        self._cancelled = True
+
+    def _report_progress(self, stage: str, done: int, total: int) -> None:
+        if self._cancelled:
+            raise SortingCancelledException('Sorting was cancelled.')
+        if self.progress_callback is not None:
+            self.progress_callback(stage, done, total)
+
+    def _iter_raw_sections(self) -> Iterator[Tuple[str, Iterator[Tuple[str, List[str]]]]]:
+        """Passes raw sections of parser through reporting quantity of loaded rows"""
+        total = sum(self.wb[section].max_row or 0 for section in self.wb.sheetnames
+                    if section in self._settings.wire_sections)
+        loaded = reported = 0
+
+        def track(device_groups: Iterator[Tuple[str, List[str]]]) -> Iterator[Tuple[str, List[str]]]:
+            nonlocal loaded, reported
+            for device_name, markers in device_groups:
+                yield device_name, markers
+                loaded += len(markers) + 1
+                if loaded - reported >= self.PROGRESS_STEP:
+                    self._report_progress('load', loaded, total)
+                    reported = loaded
+
+        for wire_section, device_groups in self.parser.iter_raw_sections():
+            yield wire_section, track(device_groups)
+        self._report_progress('load', loaded, max(loaded, total))
+
+    @property
+    def _keeps_parsed(self) -> bool:
+        """Parsed not sorted sections are stored to snapshot cache or kept for the next session run"""
+        return self._snapshot_target is not None or self._keep_warm
+
+    def _is_passed_through(self, wire_section: str) -> bool:
+        return self._lazy_sections and wire_section not in self._sheets_for_sort and not self._keeps_parsed
+
+    @staticmethod
+    def _raw_values(device_groups: Iterable[Tuple[str, List[str]]]) -> List[Any]:
+        values = []
+        for device_name, markers in device_groups:
+            values.append(device_name)
+            values.extend(markers)
+        return values
+
     def sort(self):
-        self.parser.parse()
-        for wire_section, devices in self.schematic.content.items():
-            if wire_section in self._sheets_for_sort:
-                for device in devices:
-                    device.sort()
+        if self._snapshot is None and self._max_wires_in_memory is not None:
+            self._sort_external()
+        elif self._workers != 1:
+            self._sort_parallel()
+        else:
+            self._sort_loaded()
+
+        if self._incremental_cache is not None:
+            self._incremental_cache.save()
+
+    def _sort_loaded(self) -> None:
+        """Sorts sections taken from snapshot or parsed from source workbook, in process pool when it runs"""
+        if self._snapshot is not None:
+            if self._keep_warm and self._warm is None:
+                self._warm = self._snapshot
+            self.schematic.content.update(self._snapshot.sections)
+            self._report_progress('load', 1, 1)
+            self._sort_sections(looked_up=False)
+        elif self._executor is not None and not self._keeps_parsed:
+            self._sort_in_pool()
+        else:
+            self._sort_serial()
+
+    def _sort_serial(self) -> None:
+        """Parses sections device by device, with incremental cache only changed devices are parsed and sorted"""
+        # snapshot must contain all devices parsed and not sorted, so cache can be consulted only after storing it
+        cache = self._incremental_cache if not self._keeps_parsed else None
+        tokenizer = self._settings.tokenizer
+
+        for wire_section, device_groups in self._iter_raw_sections():
+            if self._is_passed_through(wire_section):
+                self._passthrough[wire_section] = self._raw_values(device_groups)
+                continue
+            with self.instrumentation.stage('parse', wire_section) as record:
+                devices: List[Union[Device, PresortedDevice]] = []
+                for device_name, markers in device_groups:
+                    record.items += len(markers) + 1
+                    device = None
+                    if cache is not None and wire_section in self._sheets_for_sort:
+                        device = cache.get(wire_section, cache.digest(device_name, markers), device_name)
+                    if device is None:
+                        device = Parser._parse_device(device_name, markers, wire_section, tokenizer)
+                    devices.append(device)
+                self.schematic.content[wire_section] = devices
+
+        self._store_snapshot()
+        self._sort_sections(looked_up=cache is not None)
+
+    def _sort_external(self) -> None:
+        """
+        Sorts selected sections keeping at most max_wires_in_memory parsed wires in memory.
+
+        Sorted runs of every device are spilled to temporary files, devices of selected sections are
+        ExternalDevice objects, which merge their runs while being dumped. Other sections are parsed
+        or passed through as in serial mode.
+        """
+        self._spill_directory = tempfile.TemporaryDirectory(prefix='em-sort-')
+        key = Device._get_natural_sorting_priority if self._natural_order else Device._get_sorting_priority
+        tokenizer = self._settings.tokenizer
+        sections = [name for name in self.wb.sheetnames if name in self._settings.wire_sections]
+        total = sum(self.wb[name].max_row or 0 for name in sections)
+        loaded = reported = 0
+
+        for wire_section in sections:
+            if wire_section not in self._sheets_for_sort:
+                device_groups = self.parser._iter_sheet_device_groups(wire_section)
+                if self._lazy_sections:
+                    self._passthrough[wire_section] = self._raw_values(device_groups)
+                    continue
+                with self.instrumentation.stage('parse', wire_section) as record:
+                    devices = [
+                        Parser._parse_device(name, markers, wire_section, tokenizer) for name, markers in device_groups
+                    ]
+                    record.items = sum(device.markers_count + 1 for device in devices)
+                self.schematic.content[wire_section] = devices
+                continue
+
+            run_file = RunFile(Path(self._spill_directory.name) / f'{len(self.schematic.content)}.runs')
+            self._run_files.append(run_file)
+            with self.instrumentation.stage('sort', wire_section) as record:
+                devices = []
+                for device_name, markers in self.parser.iter_device_streams(wire_section):
+                    device = sort_device_external(
+                        device_name, markers, wire_section, run_file, self._max_wires_in_memory, key, tokenizer
+                    )
+                    devices.append(device)
+                    record.items += device.markers_count + 1
+                    loaded += device.markers_count + 1
+                    if loaded - reported >= self.PROGRESS_STEP:
+                        self._report_progress('load', loaded, total)
+                        reported = loaded
+            run_file.close()
+            self.schematic.content[wire_section] = devices
+
+        self._report_progress('load', loaded, max(loaded, total))
+        self._report_progress('sort', 1, 1)
+
+    def _release_spill(self) -> None:
+        """Removes temporary files of external sort, external devices can't be read after that"""
+        if self._spill_directory is None:
+            return
+        for run_file in self._run_files:
+            run_file.close()
+        self._run_files = []
+        self._spill_directory.cleanup()
+        self._spill_directory = None
+
+    def _store_snapshot(self) -> None:
+        if not self._keeps_parsed:
+            return
+        snapshot = Snapshot(self.sheetnames, dict(self.schematic.content))
+        if self._keep_warm:
+            self._warm = snapshot
+        if self._snapshot_target is not None:
+            snapshot_cache, fingerprint = self._snapshot_target
+            with self.instrumentation.stage('snapshot'):
+                snapshot_cache.store(fingerprint, snapshot)
+
+    def _sort_sections(self, looked_up: bool) -> None:
+        """
+        Sorts parsed devices of selected sections.
+
+        :param looked_up: devices were already looked up in incremental cache, parsed devices are cache misses.
+        In session mode sections sorted by previous runs are taken as is.
+        When process pool runs, devices are sorted in the pool and replaced with PresortedDevice objects.
+        """
+        cache = self._incremental_cache
+        # position of device in section, digest of its raw block and device
+        devices_to_sort: Dict[str, List[Tuple[int, Optional[str], Device]]] = {}
+        for wire_section in self._sheets_for_sort:
+            if wire_section not in self.schematic.content:
+                continue
+            if wire_section in self._warm_sorted:
+                self.schematic.content[wire_section] = self._warm_sorted[wire_section]
+                continue
+            devices = self.schematic.content[wire_section]
+            if self._warm is not None:
+                # parsed devices are kept not sorted for the next runs, sorted copies replace them in this run
+                devices = [copy.copy(device) for device in devices]
+            section_devices = devices_to_sort[wire_section] = []
+            for i, device in enumerate(devices):
+                if isinstance(device, PresortedDevice):
+                    continue
+                digest = None
+                if cache is not None:
+                    digest = cache.digest(device.name, device.markers)
+                    presorted = None if looked_up else cache.get(wire_section, digest, device.name)
+                    if presorted is not None:
+                        devices[i] = presorted
+                        continue
+                section_devices.append((i, digest, device))
+            # devices list was changed in place, assigning it again refreshes schematic index
+            self.schematic.content[wire_section] = devices
+
+        if self._executor is None:
+            self._sort_devices(devices_to_sort)
+        else:
+            self._sort_devices_in_pool(devices_to_sort)
+
+        for wire_section, section_devices in devices_to_sort.items():
+            if cache is not None:
+                for _, digest, device in section_devices:
+                    cache.put(wire_section, digest, device.markers)
+            if self._warm is not None:
+                self._warm_sorted[wire_section] = self.schematic.content[wire_section]
+
+    def _sort_devices(self, devices_to_sort: Dict[str, List[Tuple[int, Optional[str], Device]]]) -> None:
+        total = sum(len(devices) for devices in devices_to_sort.values())
+        sorted_quantity = 0
+        for wire_section, section_devices in devices_to_sort.items():
+            with self.instrumentation.stage('sort', wire_section) as record:
+                for start in range(0, len(section_devices), self.PROGRESS_STEP):
+                    chunk = [device for _, _, device in section_devices[start:start + self.PROGRESS_STEP]]
+                    sort_devices(chunk, self._natural_order)
+                    sorted_quantity += len(chunk)
+                    self._report_progress('sort', sorted_quantity, total)
+                record.items = len(section_devices)
+
+    def _sort_devices_in_pool(self, devices_to_sort: Dict[str, List[Tuple[int, Optional[str], Device]]]) -> None:
+        """Sends parsed devices of all sections to the pool at once, devices are replaced with sorted ones in place"""
+        chunks = {
+            wire_section: self._submit_chunks(
+                wire_section, ((device.name, device.markers) for _, _, device in section_devices)
+            )
+            for wire_section, section_devices in devices_to_sort.items()
+        }
+        total = sum(len(section_chunks) for section_chunks in chunks.values())
+        done = 0
+        for wire_section, section_devices in devices_to_sort.items():
+            with self.instrumentation.stage('sort', wire_section) as record:
+                sorted_devices: List[PresortedDevice] = []
+                for names, future in chunks[wire_section]:
+                    sorted_devices.extend(self._presorted_chunk(wire_section, names, future))
+                    done += 1
+                    self._report_progress('sort', done, total)
+                record.items = len(section_devices)
+
+            devices = self.schematic.content[wire_section]
+            for k, ((i, digest, _), device) in enumerate(zip(section_devices, sorted_devices)):
+                devices[i] = device
+                section_devices[k] = (i, digest, device)
+            self.schematic.content[wire_section] = devices
+
+    def _sort_parallel(self) -> None:
+        """
+        Sorts devices of selected sections in process pool, see _sort_chunk.
+
+        Workbook is read in the main process. Raw device groups of selected sections are sent to the pool
+        and never parsed in the main process, other sections are parsed or passed through as in serial mode.
+        When parsed sections are kept for snapshot or session, all sections are parsed in the main process
+        and only sorting is done in the pool.
+        """
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            self._executor = executor
+            try:
+                self._sort_loaded()
+            except BaseException:
+                # do not wait for queued chunks of cancelled or failed job
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                self._executor = None
+
+    def _sort_in_pool(self) -> None:
+        """With incremental cache only changed devices are sent to the pool"""
+        tokenizer = self._settings.tokenizer
+        sections = {}
+        for wire_section, device_groups in self._iter_raw_sections():
+            if self._is_passed_through(wire_section):
+                self._passthrough[wire_section] = self._raw_values(device_groups)
+                continue
+            with self.instrumentation.stage('parse', wire_section) as record:
+                if wire_section not in self._sheets_for_sort:
+                    devices = [
+                        Parser._parse_device(name, markers, wire_section, tokenizer) for name, markers in device_groups
+                    ]
+                    record.items = sum(device.markers_count + 1 for device in devices)
+                    self.schematic.content[wire_section] = devices
+                    continue
+                pending_devices, digests, chunks = self._submit_section(wire_section, device_groups)
+                sections[wire_section] = digests, chunks
+                record.items = self.wb[wire_section].max_row or 0
+                # devices sorted in the pool are filled in later, section keeps its place in workbook order
+                self.schematic.content[wire_section] = pending_devices
+
+        with self.instrumentation.stage('sort') as record:
+            self._collect_sections(sections)
+            record.items = sum(len(self.schematic.content[wire_section]) for wire_section in sections)
+
+    def _submit_section(
+            self, wire_section: str, device_groups: Iterator[Tuple[str, List[str]]]
+    ) -> Tuple[List[Optional[PresortedDevice]], List[str], List[Tuple[List[str], Future[List[List[str]]]]]]:
+        """Sends section chunks to the pool, in incremental mode only changed devices are sent"""
+        cache = self._incremental_cache
+        # None stands for device which is sorted in the pool
+        devices: List[Optional[PresortedDevice]] = []
+        digests: List[str] = []
+
+        def changed_groups() -> Iterator[Tuple[str, List[str]]]:
+            for device_name, markers in device_groups:
+                device = None
+                if cache is not None:
+                    digest = cache.digest(device_name, markers)
+                    device = cache.get(wire_section, digest, device_name)
+                    if device is None:
+                        digests.append(digest)
+                devices.append(device)
+                if device is None:
+                    yield device_name, markers
+
+        return devices, digests, self._submit_chunks(wire_section, changed_groups())
+
+    def _submit_chunks(
+            self, wire_section: str, device_groups: Iterable[Tuple[str, List[str]]]
+    ) -> List[Tuple[List[str], Future[List[List[str]]]]]:
+        """Names of devices of every chunk are kept here, markers are sent to the pool only"""
+        return [
+            (
+                [device_name for device_name, _ in chunk],
+                self._executor.submit(
+                    _sort_chunk, chunk, wire_section, self._natural_order, self._settings
+                ),
+            )
+            for chunk in self._chunk_device_groups(device_groups)
+        ]
+
+    def _presorted_chunk(
+            self, wire_section: str, names: List[str], future: Future[List[List[str]]]
+    ) -> List[PresortedDevice]:
+        tokenizer = self._settings.tokenizer
+        return [
+            PresortedDevice(name, markers, wire_section, tokenizer) for name, markers in zip(names, future.result())
+        ]
+
+    def _collect_sections(self, sections: Dict[str, tuple]) -> None:
+        """Puts devices sorted in the pool into their places in sections"""
+        cache = self._incremental_cache
+        total = sum(len(chunks) for _, chunks in sections.values())
+        done = 0
+        for wire_section, (digests, chunks) in sections.items():
+            sorted_devices: List[PresortedDevice] = []
+            for names, future in chunks:
+                sorted_devices.extend(self._presorted_chunk(wire_section, names, future))
+                done += 1
+                self._report_progress('sort', done, total)
+
+            if cache is not None:
+                for digest, device in zip(digests, sorted_devices):
+                    cache.put(wire_section, digest, device.markers)
+            pending = iter(sorted_devices)
+            self.schematic.content[wire_section] = [
+                device if device is not None else next(pending) for device in self.schematic.content[wire_section]
+            ]
+
+    @classmethod
+    def _chunk_device_groups(
+            cls, device_groups: Iterable[Tuple[str, List[str]]]
+    ) -> Iterable[List[Tuple[str, List[str]]]]:
+        chunk: List[Tuple[str, List[str]]] = []
+        chunk_size = 0
+        for device_name, markers in device_groups:
+            chunk.append((device_name, markers))
+            chunk_size += len(markers)
+            if chunk_size >= cls.PARALLEL_CHUNK_SIZE:
+                yield chunk
+                chunk, chunk_size = [], 0
+        if chunk:
+            yield chunk
 
     def dump_circuitry(self) -> None:
-        for wire_section, devices in self.schematic.content.items():
-            worksheet = self._output_wb.create_sheet(wire_section)
-            self._write_markers(worksheet=worksheet, devices=devices)
+        content = self.schematic.content
+        sections = [name for name in self.sheetnames if name in content or name in self._passthrough]
+        sections.extend(name for name in content if name not in sections)
+
+        total = sum(device.markers_count + 1 for devices in content.values() for device in devices)
+        total += sum(len(values) for values in self._passthrough.values())
+        written = 0
+        for wire_section in sections:
+            with self.instrumentation.stage('dump', wire_section) as record:
+                worksheet = self._create_sheet(wire_section)
+                if wire_section in self._passthrough:
+                    values = self._passthrough[wire_section]
+                    self._write_values(worksheet=worksheet, values=values)
+                    record.items = len(values)
+                    written += len(values)
+                    self._report_progress('dump', written, total)
+                    continue
+
+                devices = content[wire_section]
+                for start in range(0, len(devices), self.PROGRESS_STEP):
+                    chunk = devices[start:start + self.PROGRESS_STEP]
+                    self._write_markers(worksheet=worksheet, devices=chunk)
+                    rows = sum(device.markers_count + 1 for device in chunk)
+                    record.items += rows
+                    written += rows
+                    self._report_progress('dump', written, total)
+
+    @staticmethod
+    def output_path(target_file_path: Path, in_place=False, output_format: str = 'xlsx') -> Path:
+        """In place output of other format than source file is written next to it with the same stem"""
+        suffix = FORMAT_SUFFIXES[output_format]
+        if in_place:
+            if file_format(target_file_path) == output_format:
+                return target_file_path
+            return target_file_path.with_suffix(suffix)
+        return target_file_path.with_name(f'{target_file_path.stem}{Sorter.SORTED_STEM_SUFFIX}{suffix}')
+
+    def dump_merged_devices(self, consolidated: bool = False) -> None:
+        """
+        Writes devices of sorted sections with wires of all sections merged, see Schematic.iter_merged_devices.
+
+        Every device gets its own sheet, with consolidated flag all devices are written to one sheet.
+        Section of every marker is written next to it, table formats keep one column, so only XLSX output is supported.
+        Wires of every merged device are held in memory, so external devices sorted with max_wires_in_memory
+        are loaded whole here and the memory bound does not hold.
+        """
+        if self._output_format != 'xlsx':
+            raise UnsupportedFileFormatException(f'Merged devices can not be written in {self._output_format} format.')
+        sections = [name for name in self._sheets_for_sort if name in self.schematic.content]
+        with self.instrumentation.stage('merge') as record:
+            devices = self.schematic.iter_merged_devices(sections, natural=self._natural_order)
+            if consolidated:
+                worksheet = self._create_sheet(self._unique_sheet_title(self.MERGED_SHEET_TITLE))
+            for device in devices:
+                if not consolidated:
+                    worksheet = self._create_sheet(self._unique_sheet_title(device.name))
+                self._write_merged_device(worksheet, device)
+                record.items += device.markers_count + 1
+
+    def _unique_sheet_title(self, name: str) -> str:
+        """
+        Sheet title without characters forbidden by Excel, which does not repeat titles of written sheets.
+
+        Excel compares titles case-insensitively, repeated title gets number suffix: 'Device X2 (2)'.
+        """
+        base_title = self.INVALID_TITLE_CHARACTERS.sub('_', name)[:self.MAX_SHEET_TITLE_LENGTH]
+        title = base_title
+        number = 1
+        while title.lower() in self._sheet_titles:
+            number += 1
+            suffix = f' ({number})'
+            title = f'{base_title[:self.MAX_SHEET_TITLE_LENGTH - len(suffix)]}{suffix}'
+        return title
+
+    def _create_sheet(self, title: str) -> Union[Worksheet, TableSheet]:
+        self._sheet_titles.add(title.lower())
+        return self._output_wb.create_sheet(title)
+
+    @classmethod
+    def _write_merged_device(cls, worksheet: Union[Worksheet, TableSheet], device: Device) -> None:
+        worksheet.append([cls._header_cell(worksheet, device.name)])
+        for wire in device.wires:
+            for marker in wire.markers:
+                worksheet.append([marker, wire.section])
 
     def save_to_file(self, target_file_path: Path, in_place=False) -> None:
-        if not in_place:
-            target_file_path = target_file_path.with_name(f'{target_file_path.stem}_sorted.xlsx')
-        self._output_wb.save(target_file_path)
+        self._report_progress('save', 0, 1)
+        with self.instrumentation.stage('save'):
+            self._output_wb.save(self.output_path(target_file_path, in_place, self._output_format))
+        self._report_progress('save', 1, 1)
+        # runs of external devices were merged straight into the output sheets
+        self._release_spill()
+
+    def write_report(self, target_file_path: Path, in_place=False) -> Path:
+        """Writes machine-readable run report next to the output file"""
+        output_path = self.output_path(target_file_path, in_place, self._output_format)
+        report_path = output_path.with_name(f'{output_path.name}{self.REPORT_SUFFIX}')
+        self.instrumentation.write_report(report_path)
+        return report_path
+
+    def find_conflicts(self) -> List[Conflict]:
+        """Cross-references wires of all parsed sections, see crossref module for conflict kinds"""
+        with self.instrumentation.stage('crossref') as record:
+            conflicts = find_conflicts(self.schematic)
+            record.items = len(conflicts)
+        return conflicts
+
+    def write_conflicts(self, conflicts: List[Conflict], target_file_path: Path, in_place=False) -> Path:
+        """Writes JSON list of conflicts next to the output file"""
+        output_path = self.output_path(target_file_path, in_place, self._output_format)
+        conflicts_path = output_path.with_name(f'{output_path.name}{self.CONFLICTS_SUFFIX}')
+        with open(conflicts_path, 'w', encoding='utf-8') as f:
+            json.dump([conflict.as_dict() for conflict in conflicts], f, ensure_ascii=False, indent=2)
+        return conflicts_path
+
+    def validate(self) -> List[Problem]:
+        """
+        Collects problems of all device blocks of selected sections, see validation module for problem kinds.
+
+        Parsed workbook snapshot has no rows of markers, so when sections are taken from snapshot
+        source file is read for validation only.
+        """
+        with self.instrumentation.stage('validate') as record:
+            if self._snapshot is None:
+                problems = validate_sheets(self.parser, self._sheets_for_sort)
+            else:
+                workbook = load_workbook(self._source_path)
+                try:
+                    problems = validate_sheets(Parser(workbook, {}, self._settings), self._sheets_for_sort)
+                finally:
+                    workbook.close()
+            record.items = len(problems)
+        return problems
+
+    def write_problems(
+            self, problems: List[Problem], target_file_path: Path, in_place=False, report_format: str = 'json'
+    ) -> Path:
+        """Writes problems next to the output file as JSON list or as sheet of XLSX workbook"""
+        output_path = self.output_path(target_file_path, in_place, self._output_format)
+        problems_path = output_path.with_name(f'{output_path.name}{self.PROBLEMS_SUFFIXES[report_format]}')
+        if report_format == 'sheet':
+            write_problems_sheet(problems, problems_path)
+        else:
+            write_problems_json(problems, problems_path)
+        return problems_path
+
+    def reset(self) -> Sorter:
+        """
+        Prepares sorter for the next run keeping its configuration and loaded source workbook.
+
+        In session mode parsed and sorted sections of the loaded file are kept too.
+        """
+        self._release_spill()
+        self._init_run(trace_memory=self.instrumentation.trace_memory, profile=self.instrumentation.profile)
+        return self
 
     @classmethod
-    def reset(cls) -> Sorter:
-        """Resets object to initial state"""
-        return cls()
+    def _header_cell(cls, worksheet: Union[Worksheet, TableSheet], device_name: str) -> Any:
+        """Highlighted device header, table sheets keep no styles and get plain value"""
+        if isinstance(worksheet, TableSheet):
+            return device_name
+        device_cell = WriteOnlyCell(worksheet, value=device_name)
+        device_cell.fill = cls.DEVICE_HEADER_FILL
+        return device_cell
 
-    @staticmethod
-    def _write_markers(worksheet: Worksheet, devices: List[Device], column: int = 1) -> None:
-        row = 1
+    @classmethod
+    def _write_markers(cls, worksheet: Worksheet, devices: List[Device], column: int = 1) -> None:
+        """Appends rows one by one, so it works the same way for regular and write-only worksheets"""
+        padding = [None] * (column - 1)
         for device in devices:
-            device_sell = worksheet.cell(row=row, column=column, value=device.name)
-            device_sell.fill = PatternFill(fill_type='solid', start_color='00C0C0C0', end_color='00C0C0C0')
-            row += 1
+            worksheet.append(padding + [cls._header_cell(worksheet, device.name)])
             for marker in device.markers:
-                worksheet.cell(row=row, column=column, value=marker)
-                row += 1
+                worksheet.append(padding + [marker])
+
+    @classmethod
+    def _write_values(cls, worksheet: Worksheet, values: List[Any], column: int = 1) -> None:
+        """Writes raw values of not parsed section in the same layout as devices"""
+        padding = [None] * (column - 1)
+        for value in values:
+            if isinstance(value, str) and 'Device' in value:
+                worksheet.append(padding + [cls._header_cell(worksheet, value)])
+                continue
+            worksheet.append(padding + [value])
@@ -0,0 +1,77 @@
+# coding=utf-8
+from sys import intern
+from typing import Iterable, List, NamedTuple, Optional
+
+
+class MarkerTokens(NamedTuple):
+    wire_name: Optional[str]
+    device: Optional[str]
+    jack: Optional[str]
+    contact: Optional[str]
+    connection: Optional[str]
+    unsupported_format: bool
+
+
+UNSUPPORTED_MARKER = MarkerTokens(None, None, None, None, None, True)
+_new_tokens = tuple.__new__
+
+
+class MarkerTokenizer:
+    """
+    Marker label tokenizer with separators bound once.
+
+    Label grammar:
+        <device><ADDRESS_SEP><contact>[<ADDRESS_SEP><connection>][<WIRE_SEP><wire_name>]
+    where contact can be prefixed with jack: <jack><JACK_SEP><contact>.
+    Labels are cut with str.split, which is faster on short labels than matching them with regular expression,
+    tokens are built positionally and interned, so repeated names are stored once.
+    Tokenizer never raises on unsupported labels, it returns tokens with unsupported_format flag instead.
+    """
+
+    def __init__(self, wire_sep: str, address_sep: str, jack_sep: str):
+        self.wire_sep = wire_sep
+        self.address_sep = address_sep
+        self.jack_sep = jack_sep
+
+    def tokenize(self, label: str) -> MarkerTokens:
+        if label.__class__ is not str:
+            return UNSUPPORTED_MARKER
+        address_sep, jack_sep = self.address_sep, self.jack_sep
+
+        parts = label.split(self.wire_sep)
+        if len(parts) == 1:
+            address, wire_name = label, None
+        elif len(parts) == 2:
+            address, wire_name = parts
+            if address_sep in wire_name:
+                return UNSUPPORTED_MARKER
+        else:
+            return UNSUPPORTED_MARKER
+
+        fields = address.split(address_sep)
+        if len(fields) == 2:
+            device, contact = fields
+            connection = None
+        elif len(fields) == 3:
+            device, contact, connection = fields
+        else:
+            return UNSUPPORTED_MARKER
+
+        jack = None
+        if jack_sep in contact:
+            jack_fields = contact.split(jack_sep)
+            if len(jack_fields) == 2:
+                jack, contact = jack_fields
+                # check that jack and contact contains useful information
+                if not jack or not contact:
+                    return UNSUPPORTED_MARKER
+        # device, jack and contact names repeat across the schematic and wire name repeats in both markers of wire
+        return _new_tokens(MarkerTokens, (
+            None if wire_name is None else intern(wire_name), intern(device), None if jack is None else intern(jack),
+            intern(contact), None if connection is None else intern(connection), False
+        ))
+
+    def tokenize_many(self, labels: Iterable[str]) -> List[MarkerTokens]:
+        """Batch entry point: tokenizes all labels at once"""
+        tokenize = self.tokenize
+        return [tokenize(label) for label in labels]
@@ -1,12 +1,15 @@
 # coding=utf-8
 import os
+import re
 import sys
-from typing import TypeVar, Iterable, List
+from typing import Optional, Tuple, TypeVar, Iterable, List, Union
 import functools
 import operator
 
 T = TypeVar('T')
 
+NUMBERS_RE = re.compile(r'(\d+)')
+
 
 def pairwise(iterable: Iterable[T]):
     """ s -> (s0, s1), (s2, s3), (s4, s5), ... """
@@ -20,6 +23,40 @@ def resource_path(relative_path: str):
     return os.path.join(base_path, relative_path)
 
 
+def user_cache_dir() -> str:
+    """ Per-user cache directory of application """
+    base_path = os.getenv('LOCALAPPDATA') or os.getenv('XDG_CACHE_HOME')
+    if not base_path:
+        base_path = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base_path, 'em-sort')
+
+
+def user_config_dir() -> str:
+    """ Per-user configuration directory of application """
+    base_path = os.getenv('APPDATA') or os.getenv('XDG_CONFIG_HOME')
+    if not base_path:
+        base_path = os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(base_path, 'em-sort')
+
+
 def flatten_list(lst: List[List[T]]) -> List[T]:
     """ Flattens list of lists """
     return functools.reduce(operator.iconcat, lst, [])
+
+
+def natural_key(value: Optional[str]) -> Tuple[Tuple[Union[str, int], ...], str]:
+    """
+    Collation key for numeric-aware ordering: 'X2' < 'X10', '2' < '14'.
+
+    Text and number runs alternate in the key, so keys are always comparable.
+    Original string breaks ties between values like '01' and '1'.
+    """
+    if value is None:
+        return (), ''
+    parts: list = NUMBERS_RE.split(value)
+    parts[1::2] = map(int, parts[1::2])
+    return tuple(parts), value
+
+
+# device names, jacks and contacts repeat thousands of times, wire names are mostly unique and are not cached
+cached_natural_key = functools.lru_cache(maxsize=2 ** 16)(natural_key)
@@ -0,0 +1,86 @@
+# coding=utf-8
+"""
+Bulk validation of source workbooks.
+
+All device blocks are checked in one pass and every problem is collected with its sheet, row, device and label,
+so one run shows all errors of a workbook instead of stopping at the first one. Markers are checked
+on their tokens, nothing is raised while checking:
+    'odd_markers_count'    device has odd quantity of markers, the last marker has no pair;
+    'wire_names_mismatch'  markers of one wire have different wire names;
+    'unsupported_format'   marker label does not match marker grammar, such wires are sorted
+                           to the start of device, so the problem does not stop sorting.
+"""
+import json
+from operator import attrgetter
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple
+
+from openpyxl import Workbook
+
+from entities import Marker
+from parser import DeviceBlock, Parser
+from tokenizer import MarkerTokenizer
+
+PROBLEM_KINDS = ('odd_markers_count', 'wire_names_mismatch', 'unsupported_format')
+# problems which make sorting of workbook fail
+BLOCKING_KINDS = ('odd_markers_count', 'wire_names_mismatch')
+REPORT_FORMATS = ('json', 'sheet')
+REPORT_SHEET_TITLE = 'Problems'
+
+
+class Problem(NamedTuple):
+    sheet: str
+    row: int
+    device: str
+    label: str
+    kind: str
+
+    @property
+    def is_blocking(self) -> bool:
+        return self.kind in BLOCKING_KINDS
+
+
+def iter_block_problems(
+        sheet: str, block: DeviceBlock, tokenizer: MarkerTokenizer = Marker.TOKENIZER
+) -> Iterator[Problem]:
+    """Problems of one device block in row order, block must be read with marker rows"""
+    markers, rows = block.markers, block.marker_rows
+    tokens = tokenizer.tokenize_many(markers)
+
+    for index, (label, row, marker_tokens) in enumerate(zip(markers, rows, tokens)):
+        if marker_tokens.unsupported_format:
+            yield Problem(sheet, row, block.name, label, 'unsupported_format')
+        elif index % 2 == 0 and index + 1 < len(markers):
+            to = tokens[index + 1]
+            if marker_tokens.wire_name != to.wire_name and not to.unsupported_format:
+                label = f'{label} -> {markers[index + 1]}'
+                yield Problem(sheet, row, block.name, label, 'wire_names_mismatch')
+
+    if len(markers) % 2:
+        yield Problem(sheet, rows[-1], block.name, markers[-1], 'odd_markers_count')
+
+
+def validate_sheets(parser: Parser, sheets: Iterable[str]) -> List[Problem]:
+    """Problems of all device blocks of sheets, in order of sheets and rows, problems of one row by columns"""
+    problems: List[Problem] = []
+    for sheet in sheets:
+        sheet_problems: List[Problem] = []
+        for block in parser.iter_sheet_blocks(sheet, track_rows=True):
+            sheet_problems.extend(iter_block_problems(sheet, block, parser.settings.tokenizer))
+        # blocks standing side by side have interleaved rows
+        problems.extend(sorted(sheet_problems, key=attrgetter('row')))
+    return problems
+
+
+def write_problems_json(problems: Iterable[Problem], path: Path) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([problem._asdict() for problem in problems], f, ensure_ascii=False, indent=2)
+
+
+def write_problems_sheet(problems: Iterable[Problem], path: Path) -> None:
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(REPORT_SHEET_TITLE)
+    worksheet.append(list(Problem._fields))
+    for problem in problems:
+        worksheet.append(list(problem))
+    workbook.save(path)
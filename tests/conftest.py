@@ -18,8 +18,18 @@ def clean_workbook():
 
 
 @pytest.fixture
-def example_schematic_workbook():
-    return openpyxl.load_workbook(TEST_DATA_FOLDER / 'schematic1.xlsx')
+def example_schematic_path():
+    return TEST_DATA_FOLDER / 'schematic1.xlsx'
+
+
+@pytest.fixture
+def example_schematic_workbook(example_schematic_path):
+    return openpyxl.load_workbook(example_schematic_path)
+
+
+@pytest.fixture
+def read_only_example_schematic_workbook(example_schematic_path):
+    return openpyxl.load_workbook(example_schematic_path, read_only=True)
 
 
 @pytest.fixture
@@ -0,0 +1,98 @@
+import csv
+import shutil
+
+import pytest
+
+from backends import TableWorkbook, file_format, load_workbook
+from exceptions import UnsupportedFileFormatException
+from parser import Parser
+from sorter import Sorter
+
+
+def sort_to_values(path, wire_sections, output_format, in_place=False):
+    sorter = Sorter(write_only=True, output_format=output_format)
+    sorter.load_file(path)
+    sorter.add_sheets(wire_sections)
+    sorter.sort()
+    sorter.close()
+    sorter.dump_circuitry()
+    sorter.save_to_file(path, in_place=in_place)
+    output_path = Sorter.output_path(path, in_place, output_format)
+    workbook = load_workbook(output_path)
+    return output_path, {name: list(Parser(workbook, {})._iter_sheet_values(name)) for name in workbook.sheetnames}
+
+
+@pytest.fixture
+def example_schematic_copy(tmp_path, example_schematic_path):
+    """Outputs are written next to the source file, so tests sort a copy of test data"""
+    path = tmp_path / 'source' / 'schematic.xlsx'
+    path.parent.mkdir()
+    shutil.copy(example_schematic_path, path)
+    return path
+
+
+@pytest.fixture
+def example_schematic_csv(tmp_path, example_schematic_copy):
+    path, _ = sort_to_values(example_schematic_copy, [], 'csv')
+    csv_path = tmp_path / 'schematic.csv'
+    path.replace(csv_path)
+    return csv_path
+
+
+class TestBackends:
+    def test_file_format(self, tmp_path):
+        assert file_format(tmp_path / 'a.CSV') == 'csv'
+        assert file_format(tmp_path / 'a.feather') == 'parquet'
+        assert file_format(tmp_path / 'a.xlsm') == 'xlsx'
+
+    def test_csv_layout(self, example_schematic_csv, example_schematic_workbook):
+        with open(example_schematic_csv, newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == ['section', 'value']
+        assert rows[1] == ['1,0', example_schematic_workbook['1,0']['A1'].value]
+
+        workbook = load_workbook(example_schematic_csv)
+        assert workbook.sheetnames == example_schematic_workbook.sheetnames
+        assert workbook['1,0'].max_row == example_schematic_workbook['1,0'].max_row
+
+    def test_csv_round_trip(self, example_schematic_csv, example_schematic_copy, wire_sections_for_sort):
+        _, expected = sort_to_values(example_schematic_copy, wire_sections_for_sort, 'xlsx')
+        output_path, dumped = sort_to_values(example_schematic_csv, wire_sections_for_sort, 'csv', in_place=True)
+        assert output_path == example_schematic_csv
+        assert dumped == expected
+
+    def test_csv_without_header(self, tmp_path):
+        path = tmp_path / 'broken.csv'
+        path.write_text('1,0,Device A1\n', encoding='utf-8')
+        with pytest.raises(UnsupportedFileFormatException):
+            load_workbook(path)
+
+    def test_csv_row_without_value(self, tmp_path):
+        path = tmp_path / 'broken.csv'
+        path.write_text('section,value\n1,0\n"1,0",Device A1\n"1,0"\n', encoding='utf-8')
+        with pytest.raises(UnsupportedFileFormatException, match='line 4'):
+            load_workbook(path)
+
+    def test_table_sheet_rows(self):
+        workbook = TableWorkbook.from_records([('1,0', 'Device A1'), ('1,0', ''), ('1,0', 'A1:1 1')], 'csv')
+        assert list(workbook['1,0'].iter_rows(min_col=1, max_col=2)) == [('Device A1', None), ('A1:1 1', None)]
+
+    @pytest.mark.parametrize('suffix', ['.parquet', '.feather'])
+    def test_arrow_round_trip(self, example_schematic_csv, wire_sections_for_sort, suffix):
+        pytest.importorskip('pyarrow')
+        _, expected = sort_to_values(example_schematic_csv, wire_sections_for_sort, 'csv')
+        arrow_path = example_schematic_csv.with_suffix(suffix)
+        TableWorkbook.from_records(load_workbook(example_schematic_csv).iter_records(), 'parquet').save(arrow_path)
+        output_path, dumped = sort_to_values(arrow_path, wire_sections_for_sort, 'parquet', in_place=True)
+        assert output_path == arrow_path
+        assert dumped == expected
+
+    @pytest.mark.parametrize('suffix', ['.parquet', '.feather'])
+    def test_arrow_without_pyarrow(self, tmp_path, monkeypatch, suffix):
+        monkeypatch.setattr('importlib.util.find_spec', lambda name: None)
+        path = tmp_path / f'schematic{suffix}'
+        with pytest.raises(UnsupportedFileFormatException, match='require pyarrow'):
+            TableWorkbook.from_records([('1,0', 'Device A1')], 'parquet').save(path)
+        path.touch()
+        with pytest.raises(UnsupportedFileFormatException, match='require pyarrow'):
+            load_workbook(path)
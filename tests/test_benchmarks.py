@@ -0,0 +1,31 @@
+import openpyxl
+
+from benchmarks.run import run_benchmark
+from benchmarks.synthetic import generate_workbook
+from parser import Parser
+
+
+class TestSyntheticWorkbook:
+    def test_generate_workbook(self, tmp_path):
+        path = tmp_path / 'synthetic.xlsx'
+        total = generate_workbook(path, devices_per_section=3, markers_per_device=10, sections=('1,0', '2,5'),
+                                  unsupported_share=0.5, internal_share=0.5)
+        assert total == 2 * 3 * 10
+
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        schematic: dict = {}
+        Parser(workbook, schematic).parse()
+        workbook.close()
+
+        assert list(schematic.keys()) == ['1,0', '2,5']
+        wires = [wire for devices in schematic.values() for device in devices for wire in device.wires]
+        assert len(wires) == total // 2
+        assert any(wire.to.unsupported_format for wire in wires)
+        assert any(wire.frm.device == wire.to.device for wire in wires)
+
+    def test_run_benchmark(self, tmp_path):
+        path = tmp_path / 'synthetic.xlsx'
+        generate_workbook(path, devices_per_section=2, markers_per_device=4)
+        results = run_benchmark(path, sorter_options={})
+        assert [result['stage'] for result in results] == ['load', 'parse', 'sort', 'dump', 'save']
+        assert all(result['peak_memory_mb'] is not None for result in results)
@@ -0,0 +1,105 @@
+import shutil
+
+import openpyxl
+import pytest
+
+from cli import expand_paths, main
+from parser import Parser
+from settings import DEFAULT_SETTINGS
+
+
+@pytest.fixture
+def schematics_folder(tmp_path, example_schematic_path):
+    for name in ('a.xlsx', 'b.xlsx'):
+        shutil.copy(example_schematic_path, tmp_path / name)
+    return tmp_path
+
+
+class TestCli:
+    def test_expand_paths(self, schematics_folder):
+        paths = expand_paths([str(schematics_folder / '*.xlsx'), str(schematics_folder / 'a.xlsx'), 'missing.xlsx'])
+        assert [path.name for path in paths] == ['a.xlsx', 'b.xlsx', 'missing.xlsx']
+
+    def test_expand_paths_skips_outputs(self, schematics_folder):
+        for name in ('a_sorted.xlsx', 'a_sorted.xlsx.report.json', 'a_sorted.xlsx.problems.xlsx',
+                     'a_sorted.csv', 'a_sorted_changes.xlsx', 'a_sorted.xlsx.emsort.json'):
+            (schematics_folder / name).write_bytes(b'')
+        paths = expand_paths([str(schematics_folder / '**' / '*'), str(schematics_folder / 'a_sorted.xlsx')])
+        assert [path.name for path in paths] == ['a.xlsx', 'b.xlsx', 'a_sorted.xlsx']
+
+    def test_rerun_does_not_sort_outputs(self, schematics_folder):
+        for _ in range(2):
+            assert main([str(schematics_folder / '*.xlsx'), '-s', '1,0', '--report']) == 0
+        assert sorted(path.name for path in schematics_folder.glob('*.xlsx')) == \
+               ['a.xlsx', 'a_sorted.xlsx', 'b.xlsx', 'b_sorted.xlsx']
+
+    @pytest.mark.parametrize('options', [['-j', '1'], ['-j', '2'], ['--pipeline'], ['-w', '2']])
+    def test_main(self, schematics_folder, options, capsys, expected_sorted_schematic):
+        exit_code = main([str(schematics_folder / '*.xlsx'), '-s', '1,0', '1,5', '2,5', *options])
+
+        assert exit_code == 0
+        output = capsys.readouterr().out
+        assert '2 files, 2 sorted, 0 failed' in output
+        for name in ('a_sorted.xlsx', 'b_sorted.xlsx'):
+            sorted_workbook = openpyxl.load_workbook(schematics_folder / name)
+            dumped_markers = [row[0] for row in sorted_workbook['1,0'].values]
+            expected_markers = []
+            for device in expected_sorted_schematic['1,0']:
+                expected_markers.append(device.name)
+                expected_markers.extend(device.markers)
+            assert dumped_markers == expected_markers
+
+    def test_main_reports_errors(self, schematics_folder, capsys):
+        exit_code = main([str(schematics_folder / 'a.xlsx'), str(schematics_folder / 'missing.xlsx'), '--in-place'])
+
+        assert exit_code == 1
+        output = capsys.readouterr().out
+        assert 'missing.xlsx  FAILED FileNotFoundError' in output
+        assert '2 files, 1 sorted, 1 failed' in output
+
+    def test_main_cross_check(self, schematics_folder):
+        exit_code = main([str(schematics_folder / 'a.xlsx'), '-s', '1,0', '--cross-check'])
+
+        assert exit_code == 0
+        assert (schematics_folder / 'a_sorted.xlsx.conflicts.json').exists()
+
+    def test_merged_with_bounded_memory(self, schematics_folder):
+        with pytest.raises(SystemExit):
+            main([str(schematics_folder / 'a.xlsx'), '--merged', 'devices', '--max-wires-in-memory', '100'])
+        assert not (schematics_folder / 'a_sorted.xlsx').exists()
+
+    @pytest.mark.parametrize('options', [['--incremental'], ['-w', '2'], ['-w', '0']])
+    def test_external_sort_rejects_options(self, schematics_folder, options):
+        with pytest.raises(SystemExit):
+            main([str(schematics_folder / 'a.xlsx'), '--max-wires-in-memory', '100', *options])
+        assert not (schematics_folder / 'a_sorted.xlsx').exists()
+
+    @pytest.mark.parametrize('options', [
+        ['--max-wires-in-memory', '0'], ['--max-wires-in-memory', '-1'], ['-w', '-1'], ['-j', '0'],
+        ['--queue-size', '0'],
+    ])
+    def test_invalid_numbers(self, schematics_folder, options, capsys):
+        with pytest.raises(SystemExit):
+            main([str(schematics_folder / 'a.xlsx'), *options])
+        assert options[0] in capsys.readouterr().err
+        assert not (schematics_folder / 'a_sorted.xlsx').exists()
+
+    def test_merged_needs_xlsx(self, schematics_folder):
+        with pytest.raises(SystemExit):
+            main([str(schematics_folder / 'a.xlsx'), '--merged', 'devices', '--output-format', 'csv'])
+        assert not (schematics_folder / 'a_sorted.csv').exists()
+
+    def test_trace_memory_with_pipeline(self, schematics_folder):
+        with pytest.raises(SystemExit):
+            main([str(schematics_folder / 'a.xlsx'), '--pipeline', '--trace-memory'])
+        assert not (schematics_folder / 'a_sorted.xlsx').exists()
+
+    def test_main_settings(self, schematics_folder, tmp_path):
+        settings_path = tmp_path / 'settings.json'
+        settings_path.write_text('{"wire_sections": ["1,0"]}', encoding='utf-8')
+        with pytest.raises(SystemExit):
+            main([str(schematics_folder / 'a.xlsx'), '--settings', str(settings_path), '-s', '1,5'])
+        assert main([str(schematics_folder / 'a.xlsx'), '--settings', str(settings_path)]) == 0
+        assert openpyxl.load_workbook(schematics_folder / 'a_sorted.xlsx').sheetnames == ['1,0']
+        # settings of the run are not left behind in the process
+        assert Parser(None, {}).settings is DEFAULT_SETTINGS
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from crossref import CrossReference, find_conflicts
+from entities import Schematic
+from parser import Parser
+from sorter import Sorter
+
+
+def make_schematic(sections):
+    schematic = Schematic()
+    for section, devices in sections.items():
+        schematic.content[section] = [Parser._parse_device(name, markers, section) for name, markers in devices]
+    return schematic
+
+
+class TestCrossReference:
+    def test_no_conflicts(self):
+        schematic = make_schematic({
+            '1,0': [
+                ('Device A1', ['A1:1 1', 'X1:1:1 1', 'A1:1 1', 'K1:3 1']),
+                ('Device K1', ['K1:4 2', 'X1:2:1 2']),
+            ],
+            '1,5': [('Device A2', ['A2:1 3', 'X1:1:2 3'])],
+        })
+        assert find_conflicts(schematic) == []
+
+    def test_duplicate(self):
+        schematic = make_schematic({'1,0': [
+            ('Device A1', ['A1:1 1', 'X1:1:1 1']),
+            ('Device X1', ['X1:1:1 1', 'A1:1 1']),
+        ]})
+        [conflict] = find_conflicts(schematic)
+        assert conflict.kind == 'duplicate'
+        assert conflict.key == 'A1:1 - X1:1:1'
+        assert [occurrence.device for occurrence in conflict.occurrences] == ['Device A1', 'Device X1']
+
+    def test_cross_section(self):
+        schematic = make_schematic({
+            '1,0': [('Device A1', ['A1:1 1', 'X1:1:1 1'])],
+            '2,5': [('Device A1', ['A1:1 1', 'X1:1:1 1'])],
+        })
+        [conflict] = find_conflicts(schematic)
+        assert conflict.kind == 'cross_section'
+        assert [occurrence.section for occurrence in conflict.occurrences] == ['1,0', '2,5']
+
+    def test_name_reused(self):
+        schematic = make_schematic({'1,0': [
+            ('Device A1', ['A1:1 7', 'X1:1:1 7', 'A1:1 7', 'K1:1 7']),
+            ('Device A2', ['A2:1 7', 'X1:1:2 7', 'A2:2 7', 'X1:5:1 7']),
+        ]})
+        # terminal X1:1 connects the first three wires, wire to X1:5 is unrelated
+        [conflict] = find_conflicts(schematic)
+        assert conflict.kind == 'name_reused'
+        assert conflict.key == '7'
+        assert len(conflict.occurrences) == 4
+
+    def test_unsupported_markers_are_skipped(self):
+        schematic = make_schematic({'6,0': [('Device PE', ['Шина PE: GND', 'A1:PE', 'Шина PE: GND', 'A1:PE'])]})
+        assert CrossReference.from_schematic(schematic).by_endpoints == {}
+
+    @pytest.mark.parametrize('group_size', [1, 50])
+    def test_connected_groups(self, group_size):
+        chain = [(f'X1:{i}', f'X1:{i + 1}') for i in range(group_size)]
+        assert CrossReference._count_connected_groups(chain + [('A1:1', 'A1:2')]) == 2
+
+    def test_sorter_writes_conflicts(self, example_schematic_workbook, wire_sections_for_sort, tmp_path):
+        sorter = Sorter(workbook=example_schematic_workbook)
+        sorter.add_sheets(wire_sections_for_sort)
+        sorter.sort()
+        conflicts = sorter.find_conflicts()
+        assert {conflict.kind for conflict in conflicts} <= {'duplicate', 'cross_section', 'name_reused'}
+        assert sorter.instrumentation.records[-1].stage == 'crossref'
+
+        path = sorter.write_conflicts(conflicts, tmp_path / 'schematic.xlsx')
+        assert path.name == 'schematic_sorted.xlsx.conflicts.json'
+        with open(path, encoding='utf-8') as f:
+            assert json.load(f) == [conflict.as_dict() for conflict in conflicts]
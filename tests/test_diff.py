@@ -0,0 +1,57 @@
+import openpyxl
+import pytest
+
+from diff import WireChange, _moved_positions, diff_device, diff_devices, diff_sorted_files, main, read_sorted_devices
+
+
+class TestDiff:
+    @pytest.mark.parametrize('old_positions, moved', [
+        ([], set()),
+        ([0, 1, 2, 3], set()),
+        ([3, 0, 1, 2], {3}),
+        ([1, 2, 0], {0}),
+    ])
+    def test_moved_positions(self, old_positions, moved):
+        assert _moved_positions(old_positions) == moved
+
+    def test_diff_device(self):
+        old = [('A1:1 1', 'X1:1:1 1'), ('A1:2 2', 'X1:2:1 2'), ('A1:3 3', 'X1:3:1 3'), ('A1:4 4', 'X1:4:1 4')]
+        new = [('A1:3 3', 'X1:3:1 3'), ('A1:1 1', 'X1:1:1 1'), ('A1:2 2', 'X1:2:1 2'), ('A1:5 5', 'X1:5:1 5')]
+        assert list(diff_device('1,0', 'Device A1', old, new)) == [
+            WireChange('1,0', 'Device A1', 'removed', 'A1:4 4 -> X1:4:1 4', 4, None),
+            WireChange('1,0', 'Device A1', 'added', 'A1:5 5 -> X1:5:1 5', None, 4),
+            WireChange('1,0', 'Device A1', 'moved', 'A1:3 3 -> X1:3:1 3', 3, 1),
+        ]
+        assert list(diff_device('1,0', 'Device A1', old, list(old))) == []
+
+    def test_repeated_wires(self):
+        wire = ('A1:1 1', 'X1:1:1 1')
+        [change] = diff_device('1,0', 'Device A1', [wire], [wire, wire])
+        assert (change.change, change.new_position) == ('added', 2)
+
+    def test_diff_devices(self):
+        wire = ('A1:1 1', 'X1:1:1 1')
+        changes = diff_devices({('1,0', 'Device A1'): [wire]}, {('1,5', 'Device A1'): [wire]})
+        assert [(change.section, change.change) for change in changes] == [('1,5', 'added'), ('1,0', 'removed')]
+
+    def test_diff_sorted_files(self, tmp_path, sorted_example_schematic_workbook):
+        previous_path = tmp_path / 'previous_sorted.xlsx'
+        sorted_example_schematic_workbook.save(previous_path)
+        assert diff_sorted_files(previous_path, previous_path) == []
+
+        # swap the first two wires of the second device
+        sheet = sorted_example_schematic_workbook['1,0']
+        labels = [sheet.cell(row=row, column=1).value for row in range(5, 9)]
+        for row, label in zip(range(5, 9), labels[2:] + labels[:2]):
+            sheet.cell(row=row, column=1).value = label
+        current_path = tmp_path / 'current_sorted.xlsx'
+        sorted_example_schematic_workbook.save(current_path)
+
+        changes = diff_sorted_files(previous_path, current_path)
+        assert [(change.section, change.change, change.old_position, change.new_position) for change in changes] \
+            == [('1,0', 'moved', 2, 1)]
+        assert read_sorted_devices(current_path).keys() == read_sorted_devices(previous_path).keys()
+
+        assert main([str(previous_path), str(current_path)]) == 1
+        rows = list(openpyxl.load_workbook(tmp_path / 'current_sorted_changes.xlsx')['Changes'].values)
+        assert rows == [WireChange._fields, changes[0]]
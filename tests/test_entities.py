@@ -4,9 +4,10 @@ from pprint import pprint
 import pytest
 from contextlib import nullcontext as does_not_raise
 
-from entities import Marker, Wire, Device, Schematic
+from entities import Marker, Wire, Device, Schematic, SchematicContent
 from exceptions import UnsupportedMarkerFormatException, InvalidMarkersPairException
-from utils import flatten_list
+from tokenizer import UNSUPPORTED_MARKER
+from utils import flatten_list, natural_key
 
 
 @pytest.fixture
@@ -146,6 +147,15 @@ class TestMarker:
         marker.parse()
         assert marker.address == expected_address
 
+    def test_compact_representation(self):
+        marker1 = Marker(label=''.join(['A1:X4-1 ', '952'])).parse()
+        marker2 = Marker(label=''.join(['A1:X4-2 ', '952'])).parse()
+
+        assert not hasattr(marker1, '__dict__')
+        assert marker1.device is marker2.device
+        assert marker1.jack is marker2.jack
+        assert marker1.wire_name is marker2.wire_name
+
     def test_dander_repr(self, marker_with_valid_label_example, valid_label_example):
         marker_repr = repr(valid_label_example)
         assert repr(marker_with_valid_label_example) == f'Marker(label={marker_repr})'
@@ -198,6 +208,12 @@ class TestWire:
             assert wire.name == expected_name
             assert (wire.frm, wire.to) == (first_marker, second_marker)
 
+    def test_shared_section(self, wire_markers_pair):
+        first = Wire(frm=wire_markers_pair[0], to=wire_markers_pair[1], section=''.join(['1', ',0']))
+        second = Wire(frm=wire_markers_pair[0], to=wire_markers_pair[1], section=''.join(['1,', '0']))
+        assert not hasattr(first, '__dict__')
+        assert first.section is second.section
+
     def test_dander_str(self, valid_wire, wire_markers_pair):
         assert str(valid_wire) == f'{wire_markers_pair[0]} -> {wire_markers_pair[1]}'
 
@@ -241,6 +257,25 @@ class TestDevice:
         priority = Device._get_sorting_priority(wire)
         assert priority == expected_priority
 
+    def test_natural_sort(self):
+        wires = [
+            Wire(frm=Marker('A1:X10-1 5').parse(), to=Marker('X2:1:1 5').parse(), section='1,0'),
+            Wire(frm=Marker('A1:X2-14 4').parse(), to=Marker('X2:2:1 4').parse(), section='1,0'),
+            Wire(frm=Marker('A1:X2-2 3').parse(), to=Marker('X2:3:1 3').parse(), section='1,0'),
+        ]
+        device = Device('Device A1')
+        device.add_wires(wires)
+
+        assert device.sort().wires == [wires[0], wires[1], wires[2]]
+        assert device.sort(natural=True).wires == [wires[2], wires[1], wires[0]]
+
+    def test_natural_sorting_priority(self, list_of_10_wires):
+        unsupported_marker = Marker('A1 X4-5:1 5').apply_tokens(UNSUPPORTED_MARKER)
+        unsupported = Wire(frm=unsupported_marker, to=Marker('X2:1:1 5').parse(), section='1,0')
+        for wire in [*list_of_10_wires, unsupported]:
+            is_internal, *keys = Device._get_sorting_priority(wire)
+            assert Device._get_natural_sorting_priority(wire) == (is_internal, *map(natural_key, keys))
+
     def test_markers_property(self, device_a1):
         expected_markers = [
             'A1:X6-12 959', 'X8:34:1 959',
@@ -276,3 +311,87 @@ class TestSchematic:
 
         for wire in all_wires:
             assert wire.frm.device == 'U1'
+
+    def test_iter_devices_and_wires(self, schematic_with_content, expected_all_devices, expected_all_wires):
+        assert list(schematic_with_content.iter_devices()) == expected_all_devices
+        assert list(schematic_with_content.iter_wires()) == expected_all_wires
+
+    def test_get_devices(self, schematic_with_content):
+        devices = schematic_with_content.get_devices('Device U1')
+        assert len(devices) > 1
+        assert all(device.name == 'Device U1' for device in devices)
+        assert schematic_with_content.get_devices('Device missing') == []
+
+    def test_get_wires_by_name(self, schematic_with_content, expected_all_wires):
+        wire_name = expected_all_wires[0].frm.wire_name
+        expected = [wire for wire in expected_all_wires if wire.frm.wire_name == wire_name]
+        assert schematic_with_content.get_wires_by_name(wire_name) == expected
+
+    def test_get_wires_between(self, schematic_with_content, expected_all_wires):
+        wire = expected_all_wires[0]
+        expected = [w for w in expected_all_wires if {w.frm.device, w.to.device} == {wire.frm.device, wire.to.device}
+                    and not w.frm.unsupported_format and not w.to.unsupported_format]
+        assert schematic_with_content.get_wires_between(wire.to.device, wire.frm.device) == expected
+
+    def test_index_follows_section_replacement(self, schematic_with_content):
+        assert len(schematic_with_content.get_all_device_wires('U1')) == 19
+
+        for section in list(schematic_with_content.content):
+            schematic_with_content.content[section] = [
+                device for device in schematic_with_content.content[section] if device.name != 'Device U1'
+            ]
+        assert schematic_with_content.get_all_device_wires('U1') == []
+
+        schematic_with_content.content = {}
+        assert schematic_with_content.get_devices('Device U1') == []
+
+    def test_index_follows_in_place_changes(self, schematic_with_content):
+        section = next(iter(schematic_with_content.content))
+        devices = schematic_with_content.content[section]
+        assert schematic_with_content.get_devices('Device NEW') == []
+
+        new_device = Device('Device NEW')
+        devices.append(new_device)
+        assert schematic_with_content.get_devices('Device NEW') == [new_device]
+        devices.remove(new_device)
+        assert schematic_with_content.get_devices('Device NEW') == []
+
+        schematic_with_content.content |= {section: [new_device]}
+        assert schematic_with_content.get_devices('Device NEW') == [new_device]
+
+        content_copy = deepcopy(schematic_with_content.content)
+        assert isinstance(content_copy, SchematicContent)
+        assert content_copy == schematic_with_content.content
+
+    def test_extend_section_updates_index(self, schematic_with_content):
+        section = next(iter(schematic_with_content.content))
+        u1_devices = schematic_with_content.get_devices('Device U1')
+        index = schematic_with_content._index(section)
+
+        new_device = Device('Device U1')
+        schematic_with_content.extend_section(section, [new_device])
+        assert schematic_with_content._index(section) is index
+        devices = schematic_with_content.get_devices('Device U1')
+        assert len(devices) == len(u1_devices) + 1 and new_device in devices
+
+        schematic_with_content.extend_section('new section', [new_device])
+        assert schematic_with_content.content['new section'] == [new_device]
+
+    @pytest.mark.parametrize('natural', [False, True])
+    def test_get_merged_device(self, schematic_with_content, natural):
+        key = Device._get_natural_sorting_priority if natural else Device._get_sorting_priority
+        for device in schematic_with_content.iter_devices():
+            device.sort(natural=natural)
+        merged = schematic_with_content.get_merged_device('Device U1', natural=natural)
+        assert merged.name == 'Device U1'
+        assert merged.wires == sorted(schematic_with_content.get_all_device_wires('U1'), key=key)
+        assert {wire.section for wire in merged.wires} == {'1,0', '1,5', '2,5'}
+
+    def test_iter_merged_devices(self, schematic_with_content):
+        merged = list(schematic_with_content.iter_merged_devices(['1,5', '2,5']))
+        names = [device.name for device in merged]
+        assert len(names) == len(set(names))
+        assert names[0] == schematic_with_content.content['1,5'][0].name
+        assert sum(len(device.wires) for device in merged) == sum(
+            len(device.wires) for section in ('1,5', '2,5') for device in schematic_with_content.content[section]
+        )
@@ -0,0 +1,116 @@
+import tracemalloc
+
+import openpyxl
+import pytest
+
+from entities import Device
+from exceptions import IncompatibleOptionsException, InvalidOptionException
+from external import RunFile, sort_device_external
+from parser import Parser
+from sorter import Sorter
+
+
+@pytest.fixture
+def run_file(tmp_path):
+    run_file = RunFile(tmp_path / 'section.runs')
+    yield run_file
+    run_file.close()
+
+
+class TestExternalSort:
+    @pytest.mark.parametrize('max_wires', [1, 2, 3, 100])
+    def test_sort_device_external(self, example_schematic_workbook, run_file, max_wires):
+        parser = Parser(example_schematic_workbook, {})
+        for device_name, markers in Parser._iter_device_groups(parser._iter_sheet_values('1,0')):
+            expected = Parser._parse_device(device_name, markers, '1,0').sort()
+            device = sort_device_external(
+                device_name, iter(markers), '1,0', run_file, max_wires, Device._get_sorting_priority
+            )
+            assert device.markers_count == expected.markers_count
+            assert list(device.markers) == expected.markers
+            assert device.wires == expected.wires
+
+    def test_runs_are_bounded(self, run_file):
+        markers = ['A1:1 1', 'X1:1:1 1', 'A1:2 2', 'X1:1:2 2', 'A1:3 3', 'X1:1:3 3']
+        device = sort_device_external('Device A1', markers, '1,0', run_file, 2, Device._get_sorting_priority)
+        assert [count for _, count in device._runs] == [2, 1]
+
+    def test_runs_share_file_handle(self, run_file):
+        resource = pytest.importorskip('resource')
+        markers = []
+        for number in range(300, 0, -1):
+            markers.extend([f'A1:{number} {number}', f'X1:1:{number} {number}'])
+        device = sort_device_external('Device A1', markers, '1,0', run_file, 1, Device._get_sorting_priority)
+        # runs are merged in passes down to fan-in of the merge
+        assert len(device._runs) == 2
+
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (64, hard))
+        try:
+            merged = list(device.markers)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        assert merged == Parser._parse_device('Device A1', markers, '1,0').sort().markers
+
+    def test_merge_memory_is_bounded(self, tmp_path):
+        def generate_markers(wires_quantity):
+            for number in range(wires_quantity, 0, -1):
+                yield f'A1:{number} {number}'
+                yield f'X1:1:{number} {number}'
+
+        def sort_and_merge(wires_quantity, run_file):
+            device = sort_device_external(
+                'Device A1', generate_markers(wires_quantity), '1,0', run_file, 100, Device._get_sorting_priority
+            )
+            assert sum(1 for _ in device.markers) == wires_quantity * 2
+
+        peaks = []
+        for wires_quantity in (2000, 20000):
+            run_file = RunFile(tmp_path / f'{wires_quantity}.runs')
+            try:
+                # table of interned tokens grows once and is not counted
+                sort_and_merge(wires_quantity, run_file)
+                tracemalloc.start()
+                sort_and_merge(wires_quantity, run_file)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+                run_file.close()
+        # ten times more runs do not take more memory to merge
+        assert peaks[1] < peaks[0] * 1.5
+
+    @pytest.mark.parametrize('natural_order', [False, True])
+    def test_sorter_external_mode(self, example_schematic_workbook, wire_sections_for_sort, tmp_path, natural_order):
+        outputs = []
+        for max_wires_in_memory in (None, 2):
+            sorter = Sorter(
+                workbook=example_schematic_workbook,
+                write_only=True,
+                natural_order=natural_order,
+                lazy_sections=True,
+                max_wires_in_memory=max_wires_in_memory,
+            )
+            sorter.add_sheets(wire_sections_for_sort)
+            sorter.sort()
+            sorter.dump_circuitry()
+            save_path = tmp_path / f'{max_wires_in_memory}.xlsx'
+            sorter.save_to_file(save_path, in_place=True)
+            assert sorter._spill_directory is None
+            saved_workbook = openpyxl.load_workbook(save_path)
+            outputs.append({name: [row[0] for row in saved_workbook[name].values]
+                            for name in saved_workbook.sheetnames})
+        assert outputs[0] == outputs[1]
+
+    def test_external_mode_rejects_incompatible_options(self, example_schematic_workbook, tmp_path):
+        with pytest.raises(IncompatibleOptionsException):
+            Sorter(workbook=example_schematic_workbook, workers=2, max_wires_in_memory=2)
+        sorter = Sorter(workbook=example_schematic_workbook, max_wires_in_memory=2)
+        with pytest.raises(IncompatibleOptionsException):
+            sorter.workers = None
+        with pytest.raises(IncompatibleOptionsException):
+            sorter.enable_incremental(tmp_path / 'schematic.xlsx')
+
+    @pytest.mark.parametrize('max_wires_in_memory', [0, -1])
+    def test_external_mode_rejects_empty_chunks(self, example_schematic_workbook, max_wires_in_memory):
+        with pytest.raises(InvalidOptionException):
+            Sorter(workbook=example_schematic_workbook, max_wires_in_memory=max_wires_in_memory)
@@ -0,0 +1,61 @@
+import pytest
+
+from incremental import IncrementalCache, PresortedDevice
+from sorter import Sorter
+
+
+@pytest.fixture
+def target_file(tmp_path):
+    return tmp_path / 'schematic.xlsx'
+
+
+def incremental_sort(workbook, wire_sections, target_file, **kwargs):
+    sorter = Sorter(workbook=workbook, **kwargs)
+    sorter.add_sheets(wire_sections)
+    sorter.enable_incremental(target_file)
+    sorter.sort()
+    return sorter
+
+
+class TestIncrementalSort:
+    def test_second_run_uses_cache(self, example_schematic_workbook, wire_sections_for_sort, target_file,
+                                   expected_sorted_schematic):
+        first = incremental_sort(example_schematic_workbook, wire_sections_for_sort, target_file)
+        assert first._incremental_cache.hits == 0
+        assert (target_file.parent / f'schematic_sorted.xlsx{IncrementalCache.SUFFIX}').exists()
+
+        second = incremental_sort(example_schematic_workbook, wire_sections_for_sort, target_file)
+        assert second._incremental_cache.misses == 0
+        for wire_section in wire_sections_for_sort:
+            devices = second.schematic.content[wire_section]
+            assert all(isinstance(device, PresortedDevice) for device in devices)
+            expected_devices = expected_sorted_schematic[wire_section]
+            assert [device.markers for device in devices] == [device.markers for device in expected_devices]
+            assert [device.wires for device in devices] == [device.wires for device in expected_devices]
+
+    def test_only_changed_devices_are_sorted(self, example_schematic_workbook, wire_sections_for_sort, target_file,
+                                             expected_sorted_schematic):
+        incremental_sort(example_schematic_workbook, wire_sections_for_sort, target_file)
+
+        worksheet = example_schematic_workbook['1,0']
+        worksheet['A2'], worksheet['A3'] = worksheet['A3'].value, worksheet['A2'].value
+        sorter = incremental_sort(example_schematic_workbook, wire_sections_for_sort, target_file)
+
+        assert sorter._incremental_cache.misses == 1
+        assert [device.markers for device in sorter.schematic.content['1,5']] == \
+               [device.markers for device in expected_sorted_schematic['1,5']]
+
+    def test_parallel_incremental(self, example_schematic_workbook, wire_sections_for_sort, target_file,
+                                  expected_sorted_schematic):
+        incremental_sort(example_schematic_workbook, wire_sections_for_sort, target_file, workers=2)
+        sorter = incremental_sort(example_schematic_workbook, wire_sections_for_sort, target_file, workers=2)
+
+        assert sorter._incremental_cache.misses == 0
+        for wire_section in wire_sections_for_sort:
+            assert [device.markers for device in sorter.schematic.content[wire_section]] == \
+                   [device.markers for device in expected_sorted_schematic[wire_section]]
+
+    def test_other_mode_ignores_cache(self, example_schematic_workbook, wire_sections_for_sort, target_file):
+        incremental_sort(example_schematic_workbook, wire_sections_for_sort, target_file)
+        sorter = incremental_sort(example_schematic_workbook, wire_sections_for_sort, target_file, natural_order=True)
+        assert sorter._incremental_cache.hits == 0
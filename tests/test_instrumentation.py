@@ -0,0 +1,54 @@
+import json
+
+from instrumentation import Instrumentation
+from sorter import Sorter
+
+
+class TestInstrumentation:
+    def test_stage(self):
+        instrumentation = Instrumentation()
+        with instrumentation.stage('parse', '1,0') as record:
+            record.items = 10
+        with instrumentation.stage('parse', '1,5') as record:
+            record.items = 5
+
+        assert [(r.stage, r.section, r.items) for r in instrumentation.records] == [('parse', '1,0', 10),
+                                                                                    ('parse', '1,5', 5)]
+        assert all(r.peak_memory is None for r in instrumentation.records)
+        assert instrumentation.totals()['parse']['items'] == 15
+
+    def test_trace_memory(self):
+        instrumentation = Instrumentation(trace_memory=True)
+        with instrumentation.stage('allocate'):
+            data = [object() for _ in range(10000)]
+        assert len(data) == 10000
+        assert instrumentation.records[0].peak_memory > 10000 * 16
+
+    def test_write_report_with_profile(self, tmp_path):
+        instrumentation = Instrumentation(profile=True)
+        with instrumentation.stage('sort'):
+            sorted(range(1000), key=lambda x: -x)
+        report_path = tmp_path / 'report.json'
+        instrumentation.write_report(report_path)
+
+        report = json.loads(report_path.read_text())
+        assert report['stages'][0]['stage'] == 'sort'
+        assert report['profile'] == str(tmp_path / 'report.prof')
+        assert (tmp_path / 'report.prof').exists()
+
+    def test_sorter_run_report(self, example_schematic_workbook, wire_sections_for_sort, tmp_path):
+        sorter = Sorter(workbook=example_schematic_workbook, trace_memory=True)
+        sorter.add_sheets(wire_sections_for_sort)
+        sorter.sort()
+        sorter.dump_circuitry()
+        target = tmp_path / 'schematic.xlsx'
+        sorter.save_to_file(target)
+        report_path = sorter.write_report(target)
+
+        assert report_path == tmp_path / 'schematic_sorted.xlsx.report.json'
+        report = json.loads(report_path.read_text())
+        assert set(report['totals']) == {'parse', 'sort', 'dump', 'save'}
+        assert report['totals']['parse']['items'] == 824 + 824 + 101 + 5 + 9
+        assert report['totals']['dump']['items'] == 824 + 824 + 101 + 5 + 9
+        assert [r['section'] for r in report['stages'] if r['stage'] == 'sort'] == wire_sections_for_sort
+        assert all(r['peak_memory_bytes'] is not None for r in report['stages'])
@@ -1,6 +1,8 @@
+import openpyxl
 import pytest
 from openpyxl import Workbook
 
+from exceptions import InvalidWorkbookException
 from parser import Parser
 
 
@@ -31,3 +33,92 @@ class TestParser:
 
     def test_parse(self, parser):
         parser.parse()
+
+    def test_parse_device_odd_markers_count(self):
+        with pytest.raises(InvalidWorkbookException, match="Device A1 on sheet '1,0'"):
+            Parser._parse_device('Device A1', ['A1:1 1', 'A2:1 1', 'A1:2 2'], '1,0')
+
+    def test_iter_device_groups(self):
+        values = ['Device A1', 'A1:1 1', 'X1:1:1 1', 'Device A2', 'Device A3', 'A3:2 2', 'X1:2:1 2']
+        groups = list(Parser._iter_device_groups(values))
+        assert groups == [
+            ('Device A1', ['A1:1 1', 'X1:1:1 1']),
+            ('Device A2', []),
+            ('Device A3', ['A3:2 2', 'X1:2:1 2']),
+        ]
+
+    def test_iter_device_streams(self):
+        values = ['orphan', 'Device A1', 'A1:1 1', 'X1:1:1 1', 'Device A2', 'Device A3', 'A3:2 2', 'X1:2:1 2']
+        groups = [(device_name, list(markers)) for device_name, markers in Parser._iter_device_streams(values)]
+        assert groups == list(Parser._iter_device_groups(values[1:]))
+
+    def test_parse_read_only_workbook(self, parser, read_only_example_schematic_workbook):
+        parser.parse()
+        streaming_parser = Parser(workbook=read_only_example_schematic_workbook, schematic={})
+        streaming_parser.parse()
+        read_only_example_schematic_workbook.close()
+
+        assert streaming_parser.parsed_schematic == parser.parsed_schematic
+
+    def test_iter_device_blocks(self):
+        rows = [
+            ('Device A1', None, 'Device B1'),
+            ('A1:1 1', None, 'B1:1 1'),
+            ('X1:1:1 1', 42, 'X1:3:1 3'),
+            (None, None, ' '),
+            ('Device A2', None, 'B1:2 4'),
+            ('A2:1 2', None, 'X1:4:1 4'),
+            ('X1:2:1 2', None, None),
+        ]
+        blocks = list(Parser._iter_device_blocks(rows))
+        assert [(block.position, block.name, block.markers) for block in blocks] == [
+            ((1, 1), 'Device A1', ['A1:1 1', 'X1:1:1 1']),
+            ((1, 3), 'Device B1', ['B1:1 1', 'X1:3:1 3', 'B1:2 4', 'X1:4:1 4']),
+            ((5, 1), 'Device A2', ['A2:1 2', 'X1:2:1 2']),
+        ]
+
+    def test_parse_side_by_side_blocks(self, clean_workbook):
+        sheet = clean_workbook.create_sheet('1,0')
+        for row in [
+            ['Device A1', None, 'Device A2'],
+            ['A1:1 1', None, 'A2:1 2'],
+            [12.5, None, None],
+            ['X1:1:1 1', None, 'X1:2:1 2'],
+            [None],
+            ['Device A3'],
+            ['A3:1 3'],
+            ['X1:3:1 3'],
+        ]:
+            sheet.append(row)
+        parser = Parser(workbook=clean_workbook, schematic={})
+        parser.parse()
+        devices = parser.parsed_schematic['1,0']
+        assert [device.name for device in devices] == ['Device A1', 'Device A2', 'Device A3']
+        assert [len(device.wires) for device in devices] == [1, 1, 1]
+        assert [(name, list(markers)) for name, markers in parser.iter_device_streams('1,0')] == [
+            ('Device A1', ['A1:1 1', 'X1:1:1 1']),
+            ('Device A2', ['A2:1 2', 'X1:2:1 2']),
+            ('Device A3', ['A3:1 3', 'X1:3:1 3']),
+        ]
+
+    def test_iter_device_streams_of_many_columns(self, clean_workbook, example_schematic_workbook, tmp_path,
+                                                 monkeypatch):
+        sheet = clean_workbook.create_sheet('1,0')
+        sheet.append([None, None, None, None, 'stray note'])
+        for row in example_schematic_workbook['1,0'].iter_rows(max_col=1, values_only=True):
+            sheet.append(row)
+        side_block = ['Device B1', 'B1:1 1', 'X9:1:1 1', 'Device B2', 'B2:1 2', 'X9:2:1 2']
+        for row_index, value in enumerate(side_block, start=20):
+            sheet.cell(row_index, 3, value)
+        path = tmp_path / 'many_columns.xlsx'
+        clean_workbook.save(path)
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        parser = Parser(workbook=workbook, schematic={})
+        expected = [(block.name, block.markers) for block in parser.iter_sheet_blocks('1,0')]
+
+        # markers are not collected into blocks even though the sheet is not single-column
+        monkeypatch.setattr(Parser, '_iter_device_blocks', None)
+        streams = [(name, list(markers)) for name, markers in parser.iter_device_streams('1,0')]
+        workbook.close()
+        assert ('Device B1', ['B1:1 1', 'X9:1:1 1']) in streams
+        assert streams == expected
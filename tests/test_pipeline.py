@@ -0,0 +1,56 @@
+import asyncio
+import shutil
+
+import openpyxl
+import pytest
+
+from exceptions import IncompatibleOptionsException, InvalidOptionException
+
+from pipeline import SortJob, run_pipeline
+
+
+def sheet_values(path):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    values = {name: [row[0] for row in workbook[name].values] for name in workbook.sheetnames}
+    workbook.close()
+    return values
+
+
+class TestPipeline:
+    def test_run_pipeline(self, tmp_path, example_schematic_path, wire_sections_for_sort):
+        paths = []
+        for name in ('a.xlsx', 'b.xlsx', 'c.xlsx'):
+            shutil.copy(example_schematic_path, tmp_path / name)
+            paths.append(tmp_path / name)
+        paths.insert(1, tmp_path / 'missing.xlsx')
+
+        results = asyncio.run(run_pipeline(paths, {'sections': wire_sections_for_sort}, queue_size=1))
+
+        assert [result.path for result in results] == paths
+        assert [result.error is None for result in results] == [True, False, True, True]
+        assert results[1].error.startswith('FileNotFoundError')
+
+        reference_path = tmp_path / 'reference.xlsx'
+        shutil.copy(example_schematic_path, reference_path)
+        reference = SortJob(reference_path, sections=wire_sections_for_sort)
+        for stage in (reference.load, reference.process, reference.save):
+            stage()
+        expected = sheet_values(tmp_path / 'reference_sorted.xlsx')
+        for name in ('a', 'b', 'c'):
+            assert sheet_values(tmp_path / f'{name}_sorted.xlsx') == expected
+
+    def test_failed_stage_is_skipped(self, tmp_path):
+        job = SortJob(tmp_path / 'missing.xlsx')
+        job.run_stage(job.load)
+        job.run_stage(job.process)
+        result = job.result()
+        assert result.error.startswith('FileNotFoundError')
+        assert result.elapsed >= 0
+
+    def test_trace_memory_is_rejected(self, example_schematic_path):
+        with pytest.raises(IncompatibleOptionsException):
+            asyncio.run(run_pipeline([example_schematic_path], {'trace_memory': True}))
+
+    def test_queue_size_is_checked(self, example_schematic_path):
+        with pytest.raises(InvalidOptionException):
+            asyncio.run(run_pipeline([example_schematic_path], {}, queue_size=0))
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from entities import Marker
+from exceptions import InvalidSettingsException
+from parser import Parser
+from settings import DEFAULT_SETTINGS, Settings, get_tokenizer, load_settings
+from sorter import Sorter
+
+
+@pytest.fixture
+def custom_settings():
+    return Settings(wire_sep='/', address_sep='.', jack_sep='_', wire_sections=('S1',), input_column='B')
+
+
+class TestSettings:
+    def test_load_settings(self, tmp_path):
+        path = tmp_path / 'settings.json'
+        path.write_text(json.dumps({'address_sep': '.', 'wire_sections': ['A', 'B']}), encoding='utf-8')
+        settings = load_settings(path)
+        assert settings == DEFAULT_SETTINGS._replace(address_sep='.', wire_sections=('A', 'B'))
+
+    def test_missing_default_file(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('EM_SORT_SETTINGS', str(tmp_path / 'missing.json'))
+        assert load_settings() == DEFAULT_SETTINGS
+
+    @pytest.mark.parametrize('data', [
+        {'unknown': 1},
+        {'wire_sep': ':'},
+        {'jack_sep': '--'},
+        {'wire_sections': []},
+        {'wire_sections': '1,0'},
+        {'wire_sections': ['1,0', '']},
+        {'wire_sections': [' ']},
+        {'wire_sections': [1]},
+        {'input_column': '1'},
+    ])
+    def test_invalid_settings(self, tmp_path, data):
+        path = tmp_path / 'settings.json'
+        path.write_text(json.dumps(data), encoding='utf-8')
+        with pytest.raises(InvalidSettingsException):
+            load_settings(path)
+
+    def test_tokenizer_is_cached(self):
+        assert get_tokenizer('/', '.', '_') is get_tokenizer('/', '.', '_')
+        assert get_tokenizer('/', '.', '_') is not get_tokenizer(' ', ':', '-')
+
+    def test_digest(self):
+        assert DEFAULT_SETTINGS.digest == Settings().digest
+        assert DEFAULT_SETTINGS.digest != DEFAULT_SETTINGS._replace(jack_sep='_').digest
+
+    def test_custom_grammar(self, custom_settings):
+        assert custom_settings.tokenizer is get_tokenizer('/', '.', '_')
+        marker = Marker('A1.X4_1.2/952', custom_settings.tokenizer).parse()
+        assert (marker.device, marker.jack, marker.contact, marker.connection, marker.wire_name) == \
+               ('A1', 'X4', '1', '2', '952')
+        assert str(marker) == 'A1.X4_1.2/952'
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_sort_with_custom_grammar(self, custom_settings, clean_workbook, workers):
+        worksheet = clean_workbook.create_sheet('S1')
+        for value in ['Device A1', 'A1.1/3', 'X1.1/3', 'X1.2/5', 'A1.2/5']:
+            worksheet.append([None, value])
+        sorter = Sorter(workbook=clean_workbook, workers=workers, settings=custom_settings)
+        sorter.add_sheets(['S1'])
+        sorter.sort()
+        [device] = sorter.schematic.content['S1']
+        assert device.markers == ['X1.2/5', 'A1.2/5', 'A1.1/3', 'X1.1/3']
+        assert str(device.wires[0].frm) == 'X1.2/5'
+
+    def test_settings_are_not_global(self, custom_settings, clean_workbook):
+        Sorter(workbook=clean_workbook, settings=custom_settings)
+        parser = Parser(clean_workbook, {})
+        assert parser.settings is DEFAULT_SETTINGS
+        assert Parser._parse_device('Device A1', ['A1:X4-1 952', 'X2:14:1 952'], '1,0').wires[0].frm.jack == 'X4'
+        assert str(Marker('A1:X4-1 952').parse()) == 'A1:X4-1 952'
@@ -0,0 +1,132 @@
+import os
+import shutil
+from pathlib import Path
+
+import openpyxl
+import pytest
+
+from exceptions import SheetDoesNotExistsException
+from snapshot import Snapshot, SnapshotCache
+from sorter import Sorter
+
+
+@pytest.fixture
+def source_file(tmp_path, example_schematic_path):
+    path = tmp_path / 'schematic.xlsx'
+    shutil.copy(example_schematic_path, path)
+    return path
+
+
+@pytest.fixture
+def snapshot_cache(tmp_path):
+    return SnapshotCache(tmp_path / 'cache')
+
+
+def sort_file(path, snapshot_cache, wire_sections, **kwargs):
+    sorter = Sorter(**kwargs)
+    sorter.load_file(path, snapshot_cache=snapshot_cache)
+    sorter.add_sheets(wire_sections)
+    sorter.sort()
+    sorter.close()
+    return sorter
+
+
+class TestSnapshotCache:
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_repeated_run_skips_decoding(self, source_file, snapshot_cache, wire_sections_for_sort,
+                                         expected_sorted_schematic, workers):
+        first = sort_file(source_file, snapshot_cache, wire_sections_for_sort, workers=workers)
+        assert first.wb is not None
+        assert len(list(snapshot_cache.directory.iterdir())) == 1
+
+        second = sort_file(source_file, snapshot_cache, ['1,5', '2,5'], workers=workers)
+        assert second.wb is None
+        assert list(second.schematic.content.keys()) == list(first.schematic.content.keys())
+        for wire_section in ['1,5', '2,5']:
+            assert [device.markers for device in second.schematic.content[wire_section]] == \
+                   [device.markers for device in expected_sorted_schematic[wire_section]]
+        # sections which are not selected this time are kept in the original order
+        assert second.schematic.content['1,0'] != expected_sorted_schematic['1,0']
+
+    def test_changed_file_is_parsed_again(self, source_file, snapshot_cache, wire_sections_for_sort):
+        fingerprint = snapshot_cache.fingerprint(source_file)
+        first = sort_file(source_file, snapshot_cache, wire_sections_for_sort)
+        assert first.schematic.content['1,0'][0].markers == ['HLW1:X1 81', 'X2:61:2 81']
+
+        workbook = openpyxl.load_workbook(source_file)
+        workbook['1,0']['A2'], workbook['1,0']['A3'] = 'HLW1:X9 81', 'X2:99:2 81'
+        workbook.save(source_file)
+        assert snapshot_cache.fingerprint(source_file) != fingerprint
+
+        second = sort_file(source_file, snapshot_cache, wire_sections_for_sort)
+        # workbook is decoded again and sorted sections reflect the change
+        assert second.wb is not None
+        assert second.schematic.content['1,0'][0].markers == ['HLW1:X9 81', 'X2:99:2 81']
+
+    def test_with_incremental_cache(self, source_file, snapshot_cache, wire_sections_for_sort,
+                                    expected_sorted_schematic):
+        for _ in range(3):
+            sorter = Sorter()
+            sorter.load_file(source_file, snapshot_cache=snapshot_cache)
+            sorter.add_sheets(wire_sections_for_sort)
+            sorter.enable_incremental(source_file)
+            sorter.sort()
+            sorter.close()
+
+        assert sorter._incremental_cache.misses == 0
+        for wire_section in wire_sections_for_sort:
+            assert [device.markers for device in sorter.schematic.content[wire_section]] == \
+                   [device.markers for device in expected_sorted_schematic[wire_section]]
+
+    def test_missing_sheet(self, source_file, snapshot_cache):
+        sort_file(source_file, snapshot_cache, ['1,0'])
+        sorter = Sorter()
+        sorter.load_file(source_file, snapshot_cache=snapshot_cache)
+        with pytest.raises(SheetDoesNotExistsException):
+            sorter.add_sheets(['10,0'])
+
+    def test_lru_eviction(self, snapshot_cache):
+        snapshot = Snapshot(['1,0'], {'1,0': []})
+        snapshot_cache.store('first', snapshot)
+        size = (snapshot_cache.directory / f'first{SnapshotCache.SUFFIX}').stat().st_size
+        snapshot_cache.max_bytes = size * 2
+
+        os.utime(snapshot_cache.directory / f'first{SnapshotCache.SUFFIX}', (0, 0))
+        snapshot_cache.store('second', snapshot)
+        os.utime(snapshot_cache.directory / f'second{SnapshotCache.SUFFIX}', (1, 1))
+        # access makes first snapshot the most recently used one
+        assert snapshot_cache.load('first') is not None
+        snapshot_cache.store('third', snapshot)
+
+        assert snapshot_cache.load('second') is None
+        assert snapshot_cache.load('first') is not None
+        assert snapshot_cache.load('third') is not None
+
+    def test_snapshots_removed_by_other_process(self, snapshot_cache, monkeypatch):
+        snapshot = Snapshot(['1,0'], {'1,0': []})
+        snapshot_cache.store('first', snapshot)
+        snapshot_cache.max_bytes = 0
+        missing_path = snapshot_cache.directory / f'missing{SnapshotCache.SUFFIX}'
+        glob = Path.glob
+        monkeypatch.setattr(Path, 'glob', lambda path, pattern: [*glob(path, pattern), missing_path])
+        unlink = Path.unlink
+
+        def unlink_removed(path):
+            # the other process removes snapshot first
+            unlink(path)
+            raise FileNotFoundError(path)
+
+        monkeypatch.setattr(Path, 'unlink', unlink_removed)
+        snapshot_cache.store('second', snapshot)
+        assert list(snapshot_cache.directory.iterdir()) == []
+
+        monkeypatch.undo()
+        snapshot_cache.max_bytes = 2 ** 20
+        snapshot_cache.store('third', snapshot)
+
+        def utime_removed(path, *args):
+            raise FileNotFoundError(path)
+
+        monkeypatch.setattr(os, 'utime', utime_removed)
+        assert snapshot_cache.load('third') is not None
+        assert [path.name for path in snapshot_cache.directory.iterdir()] == [f'third{SnapshotCache.SUFFIX}']
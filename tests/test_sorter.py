@@ -1,7 +1,11 @@
+import os
+
 import openpyxl
 import pytest
 
-from exceptions import SheetDoesNotExistsException
+from exceptions import SheetDoesNotExistsException, SortingCancelledException, UnsupportedFileFormatException
+from incremental import PresortedDevice
+from parser import Parser
 from sorter import Sorter
 
 
@@ -73,11 +77,16 @@ class TestSorter:
             for sorted_device, expected_device in zip(sorted_devices, expected_devices):
                 assert sorted_device == expected_device
 
-    def test_reset(self, sorter_with_test_data):
+    def test_reset(self, sorter_with_test_data, example_schematic_workbook, wire_sections_for_sort):
+        sorter_with_test_data.add_sheets(wire_sections_for_sort)
+        sorter_with_test_data.sort()
+        sorter_with_test_data.dump_circuitry()
         empty_sorter = sorter_with_test_data.reset()
-        assert empty_sorter._input_wb is None
+        assert empty_sorter is sorter_with_test_data
+        assert empty_sorter._input_wb is example_schematic_workbook
         assert len(empty_sorter._output_wb.worksheets) == 0
         assert len(empty_sorter._sheets_for_sort) == 0
+        assert len(empty_sorter.schematic.content) == 0
 
     def test_write_to_file(self, sorter_with_test_data, wire_sections_for_sort, tmp_path):
         sorter_with_test_data.add_sheets(wire_sections_for_sort)
@@ -94,3 +103,211 @@ class TestSorter:
         save_path = save_path.with_name(f'{save_path.stem}_sorted.xlsx')
         assert save_path.exists()
         assert save_path.is_file()
+
+    def test_write_only_output(self, example_schematic_workbook, wire_sections_for_sort, tmp_path):
+        sorter = Sorter(workbook=example_schematic_workbook, write_only=True)
+        sorter.add_sheets(wire_sections_for_sort)
+        sorter.sort()
+        sorter.dump_circuitry()
+
+        save_path = tmp_path / 'out.xlsx'
+        sorter.save_to_file(save_path, in_place=True)
+
+        saved_workbook = openpyxl.load_workbook(save_path)
+        assert saved_workbook.sheetnames == list(sorter.schematic.content.keys())
+        for wire_section, devices in sorter.schematic.content.items():
+            dumped_markers = [row[0] for row in saved_workbook[wire_section].values]
+            expected_dumped_markers = []
+            for device in devices:
+                expected_dumped_markers.append(device.name)
+                expected_dumped_markers.extend(device.markers)
+            assert dumped_markers == expected_dumped_markers
+            assert saved_workbook[wire_section]['A1'].fill.start_color.rgb == '00C0C0C0'
+
+    def test_reset_keeps_write_only(self):
+        sorter = Sorter(write_only=True).reset()
+        assert sorter._write_only
+        assert len(sorter._output_wb.worksheets) == 0
+
+    def test_sort_parallel(self, example_schematic_workbook, wire_sections_for_sort, expected_sorted_schematic,
+                           monkeypatch):
+        monkeypatch.setattr(Sorter, 'PARALLEL_CHUNK_SIZE', 100)
+        sorter = Sorter(workbook=example_schematic_workbook, workers=2)
+        sorter.add_sheets(wire_sections_for_sort)
+        sorter.sort()
+
+        serial_sorter = Sorter(workbook=example_schematic_workbook)
+        serial_sorter.add_sheets(wire_sections_for_sort)
+        serial_sorter.sort()
+
+        assert list(sorter.schematic.content.keys()) == list(serial_sorter.schematic.content.keys())
+        for wire_section, devices in sorter.schematic.content.items():
+            serial_devices = serial_sorter.schematic.content[wire_section]
+            if wire_section not in wire_sections_for_sort:
+                assert devices == serial_devices
+                continue
+            # workers send back sorted markers only
+            assert all(isinstance(device, PresortedDevice) for device in devices)
+            assert [device.markers for device in devices] == [device.markers for device in serial_devices]
+            assert [device.wires for device in devices] == [device.wires for device in serial_devices]
+            assert [device.markers for device in devices] == \
+                   [device.markers for device in expected_sorted_schematic[wire_section]]
+
+    def test_session_sorts_in_pool(self, example_schematic_path, wire_sections_for_sort, expected_sorted_schematic):
+        sorter = Sorter(keep_warm=True, workers=2)
+        sorter.load_file(example_schematic_path)
+        sorter.add_sheets(wire_sections_for_sort)
+        sorter.sort()
+        sorter.close()
+
+        for wire_section in wire_sections_for_sort:
+            devices = sorter.schematic.content[wire_section]
+            assert all(isinstance(device, PresortedDevice) for device in devices)
+            assert [device.markers for device in devices] == \
+                   [device.markers for device in expected_sorted_schematic[wire_section]]
+            # parsed devices kept for the next runs are not replaced
+            assert not any(isinstance(device, PresortedDevice) for device in sorter._warm.sections[wire_section])
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_progress_reporting(self, sorter_with_test_data, wire_sections_for_sort, tmp_path, workers, monkeypatch):
+        monkeypatch.setattr(Sorter, 'PROGRESS_STEP', 10)
+        sorter = Sorter(workbook=sorter_with_test_data.wb, workers=workers)
+        reports = []
+        sorter.progress_callback = lambda stage, done, total: reports.append((stage, done, total))
+        sorter.add_sheets(wire_sections_for_sort)
+        sorter.sort()
+        sorter.dump_circuitry()
+        sorter.save_to_file(tmp_path / 'out.xlsx')
+
+        stages = [stage for stage, _, _ in reports]
+        assert stages == sorted(stages, key=['load', 'sort', 'dump', 'save'].index)
+        for stage in ('load', 'sort', 'dump', 'save'):
+            stage_reports = [(done, total) for s, done, total in reports if s == stage]
+            assert len(stage_reports) > 1
+            assert [done for done, _ in stage_reports] == sorted(done for done, _ in stage_reports)
+            assert stage_reports[-1][0] == stage_reports[-1][1]
+        # all rows of supported sheets are loaded and written
+        assert [total for s, _, total in reports if s == 'load'][-1] == 824 + 824 + 101 + 5 + 9
+        assert [total for s, _, total in reports if s == 'dump'][-1] == 824 + 824 + 101 + 5 + 9
+
+    def test_cancel(self, sorter_with_test_data, wire_sections_for_sort):
+        sorter_with_test_data.add_sheets(wire_sections_for_sort)
+        sorter_with_test_data.progress_callback = lambda stage, done, total: sorter_with_test_data.cancel()
+        with pytest.raises(SortingCancelledException):
+            sorter_with_test_data.sort()
+
+    def test_lazy_sections(self, example_schematic_workbook, tmp_path):
+        sorter = Sorter(workbook=example_schematic_workbook, lazy_sections=True)
+        sorter.add_sheets(['1,5'])
+        sorter.sort()
+        assert list(sorter.schematic.content.keys()) == ['1,5']
+
+        sorter.dump_circuitry()
+        save_path = tmp_path / 'out.xlsx'
+        sorter.save_to_file(save_path, in_place=True)
+
+        saved_workbook = openpyxl.load_workbook(save_path)
+        assert saved_workbook.sheetnames == example_schematic_workbook.sheetnames
+        for wire_section in ('1,0', '2,5', '4,0', '6,0'):
+            dumped = [row[0] for row in saved_workbook[wire_section].values]
+            assert dumped == [row[0] for row in example_schematic_workbook[wire_section].values]
+        assert saved_workbook['1,0']['A1'].fill.start_color.rgb == '00C0C0C0'
+        assert saved_workbook['1,0']['A2'].fill.fill_type is None
+
+    def test_session_reuses_parsed_file(self, example_schematic_path, expected_sorted_schematic, tmp_path,
+                                        monkeypatch):
+        source_path = tmp_path / 'schematic.xlsx'
+        source_path.write_bytes(example_schematic_path.read_bytes())
+        sorter = Sorter(keep_warm=True, lazy_sections=True)
+
+        def run(wire_sections):
+            sorter.reset()
+            sorter.load_file(source_path)
+            sorter.add_sheets(wire_sections)
+            sorter.sort()
+            sorter.close()
+            return sorter.schematic.content
+
+        first = run(['1,0'])
+        parsed_10 = list(sorter._warm.sections['1,0'])
+
+        # source file is neither opened nor parsed again, 1,0 section is not sorted again
+        monkeypatch.setattr('sorter.load_workbook', lambda *args, **kwargs: pytest.fail('file was loaded'))
+        monkeypatch.setattr(Parser, '_parse_device', lambda *args: pytest.fail('device was parsed'))
+        second = run(['1,0', '2,5'])
+        assert second['1,0'] is first['1,0']
+        for wire_section in ('1,0', '2,5'):
+            assert [device.markers for device in second[wire_section]] == \
+                   [device.markers for device in expected_sorted_schematic[wire_section]]
+        # kept parsed devices stay in source order, so not selected sections are written unsorted
+        assert sorter._warm.sections['1,0'] == parsed_10
+        assert [device.markers for device in second['1,5']] != \
+               [device.markers for device in expected_sorted_schematic['1,5']]
+
+        # changed file is loaded and parsed again
+        monkeypatch.undo()
+        os.utime(source_path, ns=(0, 0))
+        run(['1,5'])
+        assert list(sorter._warm_sorted) == ['1,5']
+
+        # sections sorted in the other order are not reused
+        sorter.natural_order = True
+        assert sorter._warm_sorted == {}
+        natural = run(['1,5'])
+        expected = Sorter(natural_order=True)
+        expected.load_file(source_path)
+        expected.add_sheets(['1,5'])
+        expected.sort()
+        expected.close()
+        assert [device.markers for device in natural['1,5']] == \
+               [device.markers for device in expected.schematic.content['1,5']]
+
+    @pytest.mark.parametrize('consolidated', [False, True])
+    def test_dump_merged_devices(self, example_schematic_workbook, wire_sections_for_sort, tmp_path, consolidated):
+        sorter = Sorter(workbook=example_schematic_workbook, write_only=True)
+        sorter.add_sheets(wire_sections_for_sort)
+        sorter.sort()
+        sorter.dump_circuitry()
+        sorter.dump_merged_devices(consolidated=consolidated)
+        save_path = tmp_path / 'out.xlsx'
+        sorter.save_to_file(save_path, in_place=True)
+
+        saved_workbook = openpyxl.load_workbook(save_path)
+        merged = list(sorter.schematic.iter_merged_devices(wire_sections_for_sort))
+        extra_sheets = saved_workbook.sheetnames[len(example_schematic_workbook.sheetnames):]
+        if consolidated:
+            assert extra_sheets == [Sorter.MERGED_SHEET_TITLE]
+        else:
+            assert extra_sheets == [device.name for device in merged]
+        rows = [row for title in extra_sheets for row in saved_workbook[title].iter_rows(values_only=True)]
+        expected_rows = []
+        for device in merged:
+            expected_rows.append((device.name, None))
+            expected_rows.extend((marker, wire.section) for wire in device.wires for marker in wire.markers)
+        assert rows == expected_rows
+        assert saved_workbook[extra_sheets[0]]['A1'].fill.start_color.rgb == '00C0C0C0'
+
+    def test_merged_devices_need_xlsx(self, example_schematic_workbook, wire_sections_for_sort):
+        sorter = Sorter(workbook=example_schematic_workbook, output_format='csv')
+        sorter.add_sheets(wire_sections_for_sort)
+        sorter.sort()
+        with pytest.raises(UnsupportedFileFormatException):
+            sorter.dump_merged_devices()
+
+    def test_unique_sheet_title(self, empty_sorter):
+        empty_sorter._create_sheet('Device X2')
+        assert empty_sorter._unique_sheet_title('Device X2') == 'Device X2 (2)'
+        assert empty_sorter._unique_sheet_title('Device A1/B:2') == 'Device A1_B_2'
+        assert len(empty_sorter._unique_sheet_title('Device ' + 'X' * 40)) == Sorter.MAX_SHEET_TITLE_LENGTH
+
+    def test_unique_sheet_title_collisions(self, empty_sorter):
+        titles = []
+        for name in ('Device X2', 'device x2', 'DEVICE X2', 'Device X2', 'Device X2 (2)'):
+            titles.append(empty_sorter._unique_sheet_title(name))
+            empty_sorter._create_sheet(titles[-1])
+        assert titles == ['Device X2', 'device x2 (2)', 'DEVICE X2 (3)', 'Device X2 (4)', 'Device X2 (2) (2)']
+
+        long_name = 'Device ' + 'X' * 40
+        for _ in range(4):
+            empty_sorter._create_sheet(empty_sorter._unique_sheet_title(long_name))
+        assert empty_sorter._output_wb.sheetnames[-3:] == [f'Device {"X" * 20} ({number})' for number in (2, 3, 4)]
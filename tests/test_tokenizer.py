@@ -0,0 +1,59 @@
+import pytest
+
+from entities import Marker
+from exceptions import UnsupportedMarkerFormatException
+from tokenizer import MarkerTokenizer, MarkerTokens, UNSUPPORTED_MARKER
+
+
+@pytest.fixture
+def tokenizer():
+    return MarkerTokenizer(wire_sep=' ', address_sep=':', jack_sep='-')
+
+
+class TestMarkerTokenizer:
+    @pytest.mark.parametrize(
+        'label,expected',
+        [
+            pytest.param('X2:14:1 9', MarkerTokens('9', 'X2', None, '14', '1', False), id='with connection'),
+            pytest.param('A1:X4-1 952', MarkerTokens('952', 'A1', 'X4', '1', None, False), id='with jack'),
+            pytest.param('A1:GND2', MarkerTokens(None, 'A1', None, 'GND2', None, False), id='only device and contact'),
+            pytest.param('SF1:11 ', MarkerTokens('', 'SF1', None, '11', None, False), id='empty wire name'),
+            pytest.param('A1:X1.1.1-1', MarkerTokens(None, 'A1', 'X1.1.1', '1', None, False), id='jack with dots'),
+            pytest.param('SB1:1-2-3 4', MarkerTokens('4', 'SB1', None, '1-2-3', None, False), id='several jack seps'),
+        ]
+    )
+    def test_tokenize(self, tokenizer, label, expected):
+        tokens = tokenizer.tokenize(label)
+        assert tokens == expected
+        assert type(tokens) is MarkerTokens
+        assert tokens.contact == expected.contact
+
+    @pytest.mark.parametrize(
+        'label',
+        ['', 'Device A1', 'A1 X4-5:1 46', 'SF1:11  ', 'SG:- 1A1', 'SG:1- 1A1', 'X1:1:1:1', 'X2:14 a:b', None, 42]
+    )
+    def test_tokenize_unsupported(self, tokenizer, label):
+        assert tokenizer.tokenize(label) == UNSUPPORTED_MARKER
+
+    def test_tokenize_many(self, tokenizer):
+        labels = ['X2:14:1 9', 'Device A1', 'PE:PE']
+        assert tokenizer.tokenize_many(labels) == [tokenizer.tokenize(label) for label in labels]
+        assert [tokens.unsupported_format for tokens in tokenizer.tokenize_many(labels)] == [False, True, False]
+
+    def test_custom_separators(self):
+        tokenizer = MarkerTokenizer(wire_sep='/', address_sep='.', jack_sep='#')
+        assert tokenizer.tokenize('A1.X4#1/952') == MarkerTokens('952', 'A1', 'X4', '1', None, False)
+        assert tokenizer.tokenize('A1.X4#1.2') == MarkerTokens(None, 'A1', 'X4', '1', '2', False)
+
+    @pytest.mark.parametrize('label', ['X2:14:1 9', 'A1:X4-1 952', 'A1:GND2', 'PE:PE', 'SF1:2 2', 'SG:- 1A1'])
+    def test_matches_marker_parse(self, tokenizer, label):
+        marker = Marker(label)
+        try:
+            marker.parse()
+        except UnsupportedMarkerFormatException:
+            pass
+        tokens = tokenizer.tokenize(label)
+        if tokens.unsupported_format:
+            assert marker.unsupported_format
+        else:
+            assert (marker.wire_name, marker.device, marker.jack, marker.contact, marker.connection) == tokens[:5]
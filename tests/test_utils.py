@@ -0,0 +1,22 @@
+import pytest
+
+from utils import natural_key, pairwise
+
+
+def test_pairwise():
+    assert list(pairwise([1, 2, 3, 4])) == [(1, 2), (3, 4)]
+
+
+@pytest.mark.parametrize(
+    'smaller,bigger',
+    [
+        ('X2', 'X10'),
+        ('2', '14'),
+        ('1.2', '1.10'),
+        ('A', 'A1'),
+        ('01', '1'),
+        (None, ''),
+    ]
+)
+def test_natural_key(smaller, bigger):
+    assert natural_key(smaller) < natural_key(bigger)
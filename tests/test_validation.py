@@ -0,0 +1,99 @@
+import json
+
+import openpyxl
+import pytest
+
+from exceptions import InvalidWorkbookException
+from parser import DeviceBlock, Parser
+from pipeline import SortJob
+from snapshot import SnapshotCache
+from validation import Problem, iter_block_problems, validate_sheets
+
+
+@pytest.fixture
+def broken_schematic_path(tmp_path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = '1,0'
+    for row in [
+        ['Device A1', None, 'Device A2'],
+        ['A1:1 1', None, 'A2:1 2'],
+        ['X1:1:1 1', None, 'X1:2:1 3'],
+        ['A1:2 4'],
+        [None],
+        ['Device A3'],
+        ['A3:1 5'],
+        ['Шина PE: GND'],
+    ]:
+        sheet.append(row)
+    path = tmp_path / 'broken.xlsx'
+    workbook.save(path)
+    return path
+
+
+class TestValidation:
+    def test_iter_block_problems(self):
+        block = DeviceBlock(
+            (1, 1), 'Device A1', ['A1:1 1', 'X1:1:2 2', 'Шина PE: GND', 'A1:PE', 'A1:3 3'], [2, 3, 5, 6, 7]
+        )
+        assert list(iter_block_problems('1,0', block)) == [
+            Problem('1,0', 2, 'Device A1', 'A1:1 1 -> X1:1:2 2', 'wire_names_mismatch'),
+            Problem('1,0', 5, 'Device A1', 'Шина PE: GND', 'unsupported_format'),
+            Problem('1,0', 7, 'Device A1', 'A1:3 3', 'odd_markers_count'),
+        ]
+
+    def test_validate_sheets(self, broken_schematic_path):
+        workbook = openpyxl.load_workbook(broken_schematic_path, read_only=True)
+        problems = validate_sheets(Parser(workbook, {}), ['1,0'])
+        workbook.close()
+
+        assert [(problem.row, problem.device, problem.kind) for problem in problems] == [
+            (2, 'Device A2', 'wire_names_mismatch'),
+            (4, 'Device A1', 'odd_markers_count'),
+            (8, 'Device A3', 'unsupported_format'),
+        ]
+
+    def test_valid_schematic(self, example_schematic_path, tmp_path, wire_sections_for_sort):
+        job = SortJob(example_schematic_path, sections=wire_sections_for_sort, validate='json')
+        job.load()
+        problems = job.sorter.validate()
+        job.sorter.close()
+        assert not any(problem.is_blocking for problem in problems)
+
+    @pytest.mark.parametrize('report_format, suffix', [('json', '.json'), ('sheet', '.xlsx')])
+    def test_sort_job_stops_on_problems(self, broken_schematic_path, report_format, suffix):
+        job = SortJob(broken_schematic_path, validate=report_format)
+        job.load()
+        with pytest.raises(InvalidWorkbookException, match='2 of 3 problems'):
+            job.process()
+
+        problems_path = broken_schematic_path.with_name(f'broken_sorted.xlsx.problems{suffix}')
+        if report_format == 'json':
+            problems = json.loads(problems_path.read_text(encoding='utf-8'))
+            assert [problem['kind'] for problem in problems] == [
+                'wire_names_mismatch', 'odd_markers_count', 'unsupported_format'
+            ]
+        else:
+            rows = list(openpyxl.load_workbook(problems_path)['Problems'].values)
+            assert rows[0] == Problem._fields
+            assert len(rows) == 4
+
+    def test_validate_with_snapshot(self, tmp_path):
+        workbook = openpyxl.Workbook()
+        workbook.active.title = '1,0'
+        for value in ['Device A1', 'A1:1 1', 'X1:1:1 1', 'Шина PE: GND', 'A1:PE']:
+            workbook.active.append([value])
+        path = tmp_path / 'schematic.xlsx'
+        workbook.save(path)
+        snapshot_cache = SnapshotCache(tmp_path / 'snapshots')
+
+        for _ in range(2):
+            job = SortJob(path, validate='json', snapshot_cache=snapshot_cache)
+            job.load()
+            job.process()
+            job.save()
+            problems_path = tmp_path / 'schematic_sorted.xlsx.problems.json'
+            problems = json.loads(problems_path.read_text(encoding='utf-8'))
+            problems_path.unlink()
+            assert [(problem['row'], problem['kind']) for problem in problems] == [(4, 'unsupported_format')]
+        assert job.sorter._snapshot is not None